@@ -5,215 +5,467 @@
 # 2. Run 'pip install -r requirements.txt'
 # 3. Run 'streamlit run app.py'
 #
-# This application will create two files and one folder in the same directory:
+# This application will create these files and folders in the same directory:
 # - users.json: Stores user registration data (hashed password, onboarding status).
-# - data.json: Stores all persistent application data (analysis history, points, routines, etc.).
+# - data/users/<digest>.json: One file per user with their app data (analysis history, points, routines, etc.).
+#   A data.json from older versions is split into these files on first start and kept as data.json.bak.
+# - events.jsonl: Append-only log of small mutations (forum, kit, routine, points), folded into the user files at startup.
+# - analysis_archive.jsonl: Older analyses trimmed from the user files, one JSON line each.
 # - reports/: Stores generated PDF reports.
 #
-# All data is local. To reset the application, delete users.json and data.json.
+# All data is local. To reset the application, delete users.json, data/, events.jsonl and analysis_archive.jsonl.
 # This app contains no external API calls, databases, or network requests.
 
 import streamlit as st
 import json
+try:
+    import orjson # Optional fast JSON backend; falls back to the stdlib json module
+except ImportError:
+    orjson = None
 import hashlib
+import hmac
+import secrets
 import uuid
 import os
+import atexit
+import tempfile
+from itertools import cycle
+from types import MappingProxyType
+from typing import Final
 from PIL import Image
 import io
-import pandas as pd
-import altair as alt
-from fpdf import FPDF
+import base64
+import html
+import numpy as np
 from datetime import datetime, date, timedelta
 
 # --- Configuration & Constants ---
 USERS_FILE = 'users.json'
-DATA_FILE = 'data.json'
+DATA_FILE = 'data.json' # Legacy single-file store, migrated into USER_DATA_FOLDER
+USER_DATA_FOLDER = os.path.join('data', 'users')
+EVENTS_FILE = 'events.jsonl'
+ARCHIVE_FILE = 'analysis_archive.jsonl'
+MAX_ANALYSIS_HISTORY = 20 # Analyses kept in each user file; older ones move to ARCHIVE_FILE
 REPORTS_FOLDER = 'reports'
 DEFAULT_THEME_COLOR = '#EAF6FF' # Soft blue
 ACCENT_COLOR = '#007BFF'
 
 # --- Initialization & Data Management ---
 
+def _dumps(data):
+    """Serializes data to indented UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _loads(raw):
+    """Parses JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 def load_data(file_path, default_data):
     """Loads data from a JSON file, or creates it if it doesn't exist."""
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return _loads(f.read())
     except FileNotFoundError:
-        with open(file_path, 'w') as f:
-            json.dump(default_data, f, indent=4)
+        _write_atomic(file_path, default_data)
         return default_data
-    except json.JSONDecodeError:
+    except ValueError: # json.JSONDecodeError and orjson.JSONDecodeError both subclass ValueError
         st.error(f"Error decoding {file_path}. The file might be corrupted.")
         return default_data
 
+@st.cache_resource
+def _pending_writes():
+    """Process-wide map of file path -> data waiting to be flushed to disk."""
+    pending = {}
+    atexit.register(flush_data) # Don't lose writes queued by a rerun that never finished
+    return pending
+
 def save_data(file_path, data):
-    """Saves data to a JSON file."""
+    """Marks a JSON file dirty; the write itself happens once per rerun in flush_data."""
+    _pending_writes()[file_path] = data
+
+def _write_atomic(file_path, data):
+    """Writes a JSON file via a temp file in the same folder + os.replace, so readers never see a partial file."""
+    payload = _dumps(data)
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(os.path.abspath(file_path)), delete=False) as tmp:
+            tmp_path = tmp.name
+            tmp.write(payload)
+            tmp.flush()
+            os.fsync(tmp.fileno()) # Data must be on disk before the rename makes it visible
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def flush_data():
+    """Writes every dirty JSON file atomically."""
+    pending = _pending_writes()
+    while pending:
+        file_path, data = pending.popitem()
+        try:
+            _write_atomic(file_path, data)
+        except Exception as e:
+            st.error(f"Error saving data to {file_path}: {e}")
+
+# --- Event Log ---
+# Small, frequent mutations (forum posts/comments, kit changes, routine completion, points) are appended
+# to EVENTS_FILE as one JSON line each instead of rewriting the user's file per click.
+# The log is folded back into the user files once per process by compact_events. Every event is
+# idempotent, so replaying it over a user file that already contains it is harmless.
+
+def new_user_data():
+    """Returns an empty per-user entry for the main DATA store."""
+    return {
+        'onboarding': {},
+        'analysis_history': [],
+        'points': 0,
+        'routine': {'morning': [], 'evening': []},
+        'kit': {}, # product id -> saved product subset
+        'daily_completion': {},
+        'forum_posts': [],
+        'expert_requests': [],
+    }
+
+def _apply_event(data, event):
+    """Applies one logged mutation to the in-memory store."""
+    user_data = data.setdefault(event['user'], new_user_data())
+    kind = event['type']
+    if kind == 'forum_post':
+        post = event['post']
+        if all(p['id'] != post['id'] for p in user_data['forum_posts']):
+            user_data['forum_posts'].insert(0, post)
+    elif kind == 'forum_comment':
+        owner_posts = data.get(event['post_owner'], {}).get('forum_posts', [])
+        post = next((p for p in owner_posts if p['id'] == event['post_id']), None)
+        comment = event['comment']
+        if post is not None and all(c.get('id') != comment['id'] for c in post['comments']):
+            post['comments'].append(comment)
+    elif kind == 'kit_add':
+        user_data['kit'][event['item']['id']] = event['item']
+    elif kind == 'kit_remove':
+        user_data['kit'].pop(event['product_id'], None)
+    elif kind == 'daily_completion':
+        user_data['daily_completion'].setdefault(event['day'], {}).update(event['entry'])
+    elif kind == 'points':
+        user_data['points'] = event['total']
+
+def _normalize_kit(user_data):
+    """Converts a stored kit to the in-memory {product id: product} form.
+
+    Handles the legacy list-of-products layout and JSON's string object keys.
+    """
+    kit = user_data.get('kit', {})
+    products = kit if isinstance(kit, list) else kit.values()
+    user_data['kit'] = {p['id']: p for p in products}
+
+def _encode_event(event):
+    """Serializes an event as one compact JSON line."""
+    if orjson is not None:
+        return orjson.dumps(event) + b'\n'
+    return json.dumps(event, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+def append_event(username, event):
+    """Applies a mutation to DATA and appends it to the event log; a click writes O(event) bytes."""
+    event = {'user': username, **event}
+    _apply_event(DATA, event)
+    try:
+        with open(EVENTS_FILE, 'ab') as f:
+            f.write(_encode_event(event))
+    except Exception as e:
+        st.error(f"Error saving data to {EVENTS_FILE}: {e}")
+
+def archive_analyses(username, analyses):
+    """Appends analyses trimmed from a user's history to ARCHIVE_FILE, one JSON line each.
+
+    Returns False if the archive could not be written, in which case nothing should be trimmed.
+    """
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4)
+        with open(ARCHIVE_FILE, 'ab') as f:
+            f.writelines(_encode_event({'user': username, 'analysis': a}) for a in analyses)
     except Exception as e:
-        st.error(f"Error saving data to {file_path}: {e}")
+        st.error(f"Error saving data to {ARCHIVE_FILE}: {e}")
+        return False
+    return True
+
+@st.cache_resource(show_spinner=False)
+def compact_events(_data):
+    """Replays EVENTS_FILE into the DATA store once per process, persists it and clears the log."""
+    try:
+        with open(EVENTS_FILE, 'rb') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return
+    touched = set()
+    for line in lines:
+        try:
+            event = _loads(line)
+        except ValueError: # A torn final line from a crash mid-append
+            continue
+        _apply_event(_data, event)
+        touched.add(event['user'])
+        if event['type'] == 'forum_comment':
+            touched.add(event['post_owner']) # Comments live on the post owner's entry
+    for username in touched & _data.keys():
+        try:
+            _write_atomic(user_data_path(username), _user_record(username, _data[username]))
+        except Exception as e:
+            st.error(f"Error saving data for {username}: {e}")
+            return # Keep the log so nothing is lost; it will be replayed next start
+    os.remove(EVENTS_FILE)
+
+@st.cache_resource(show_spinner=False) # Runs before set_page_config, so it must not emit a spinner
+def _load_users():
+    """Loads users.json once per process; reruns share (and mutate) the same dict."""
+    return load_data(USERS_FILE, {})
+
+def user_data_path(username):
+    """Path of a user's JSON file, named by a hex digest of the username.
+
+    Digests never collide on case-insensitive filesystems (Bob/bob) or hit reserved names (CON, NUL);
+    the username itself is kept inside the file.
+    """
+    digest = hashlib.sha256(username.encode('utf-8')).hexdigest()
+    return os.path.join(USER_DATA_FOLDER, digest + '.json')
+
+def _user_record(username, user_data):
+    """The on-disk form of a user file: the username alongside that user's data."""
+    return {'username': username, 'data': user_data}
+
+@st.cache_resource(show_spinner=False)
+def _load_app_data():
+    """Loads every user file once per process; reruns share (and mutate) the same dict.
+
+    All users are loaded up front because the community forum lists everyone's posts.
+    """
+    data = {}
+    for file_name in os.listdir(USER_DATA_FOLDER):
+        if file_name.endswith('.json'):
+            record = load_data(os.path.join(USER_DATA_FOLDER, file_name), {})
+            if 'username' in record: # Skips a corrupted file rather than guessing its owner
+                data[record['username']] = record['data']
+    if os.path.exists(DATA_FILE):
+        _migrate_data_file(data)
+    for user_data in data.values():
+        _normalize_kit(user_data)
+    return data
+
+def _migrate_data_file(data):
+    """Splits a legacy data.json into per-user files, then sets it aside as data.json.bak."""
+    legacy = load_data(DATA_FILE, {})
+    for username, user_data in legacy.items():
+        if username in data: # A per-user file is newer than the legacy store
+            continue
+        try:
+            _write_atomic(user_data_path(username), _user_record(username, user_data))
+        except Exception as e:
+            st.error(f"Error saving data for {username}: {e}")
+            return # Leave data.json in place so the next start retries
+        data[username] = user_data
+    os.replace(DATA_FILE, DATA_FILE + '.bak')
+
+@st.cache_resource(show_spinner=False)
+def _ensure_folders():
+    """Creates the reports and user data folders once per process."""
+    os.makedirs(REPORTS_FOLDER, exist_ok=True)
+    os.makedirs(USER_DATA_FOLDER, exist_ok=True)
 
 # Global data containers
 # Note for future development: Replace this simple JSON storage with a more robust DB (e.g., Firebase, Supabase, PostgreSQL)
 # The user_data can be accessed via st.session_state['user_data'] to avoid passing it around.
-USERS = load_data(USERS_FILE, {})
-DATA = load_data(DATA_FILE, {})
-if REPORTS_FOLDER not in os.listdir('.'):
-    os.makedirs(REPORTS_FOLDER, exist_ok=True)
+# Streamlit re-executes this script on every rerun, so the stores are cached singletons and
+# only save_data touches the disk.
+_ensure_folders()
+USERS = _load_users()
+DATA = _load_app_data()
+compact_events(DATA)
 
 # --- Localization & Translation ---
 # Simple dictionary for English/Hindi translations
 
+TRANSLATIONS = {
+    'English': {
+        # Authentication
+        'login': 'Login', 'register': 'Register', 'logout': 'Logout',
+        'username': 'Username', 'password': 'Password',
+        'login_success': 'Logged in successfully!',
+        'reg_success': 'Registration successful! Please log in.',
+        'invalid_cred': 'Invalid username or password.',
+        'user_exists': 'Username already exists.',
+        # Sidebar
+        'onboarding': 'Onboarding', 'dashboard': 'Dashboard',
+        'skin_analyzer': 'Skin Analyzer', 'my_routine': 'My Routine',
+        'marketplace': 'Product Marketplace', 'my_kit': 'Personalized Kit',
+        'academy': 'Skincare Academy', 'forum': 'Community Forum',
+        'expert_consult': 'Consult an Expert', 'hyper_advice': 'Hyper-Personalized Advice',
+        'ai_chatbot': 'AI Chatbot', 'daily_checker': 'Daily Routine AI Checker',
+        'lang_toggle': 'Language',
+        # Onboarding
+        'setup_title': '2-Minute Onboarding Setup',
+        'full_name': 'Full Name', 'age': 'Age', 'location': 'Location (Country/City)',
+        'primary_concerns': 'Primary Concerns', 'skin_type': 'Skin Type',
+        'pref_lang': 'Preferred Language', 'onboard_complete': 'Onboarding Complete!',
+        'onboard_btn': 'Save Onboarding',
+        # Dashboard
+        'welcome': 'Welcome,', 'skin_score': 'Skin Score', 'routine_summary': 'Quick Routine Summary',
+        'score_over_time': 'Skin Score over Time', 'start_analysis': 'Start Skin Analysis',
+        'last_score': 'Last Score', 'last_analysis_date': 'Last Analysis Date',
+        'daily_pts': 'Daily Points', 'total_pts': 'Total Points',
+        # Generic
+        'coming_soon': 'Coming Soon', 'download_report': 'Download Report',
+        'save_kit': 'Save to My Kit', 'post_question': 'Post Question',
+        'submit_request': 'Submit Request', 'simulate': 'Simulate',
+        'morning_routine': 'Morning Routine', 'evening_routine': 'Evening Routine',
+        'completion': 'Completion', 'streak': 'Routine Streak',
+        'view_analysis_details': 'View Analysis Details',
+        'points_earned': 'Points Earned:', 'today_score': "Today's Routine Score",
+        'good_job': 'Good job! You completed your routine.',
+        'more_work': 'You missed some steps. Try again tomorrow!',
+        'analysis_header': 'Your Hyper-Personalized Skin Analysis',
+        'detected_type': 'Detected Skin Type', 'current_score': 'Current Skin Score',
+        'future_proj': 'Future Score Projection', 'hydration': 'Hydration Score',
+        'acne_risk': 'Acne Risk %', 'pig_risk': 'Pigmentation Risk %',
+        'pore_vis': 'Pore Visibility Estimate', 'sleep_impact': 'Sleep Impact %',
+        'stress_impact': 'Stress Impact %', 'recs': 'Personalized Recommendations',
+        'lifestyle_actions': 'Lifestyle Actions', 'product_categories': 'Product Categories',
+        'analysis_not_found': 'No analysis found. Please run the Skin Analyzer first.',
+        'kit_empty': 'Your Personalized Kit is empty. Save products from the Marketplace.',
+        'why_this_kit': 'Why this Kit is Recommended for You',
+        'community_q': 'Community Questions & Answers',
+        'your_question': 'Your Question', 'post': 'Post',
+        'new_post': 'Post a New Question', 'ask_expert': 'Ask an Expert',
+        'pref_date_time': 'Preferred Date/Time', 'short_note': 'Short Note',
+        'requests_submitted': 'Submitted Requests', 'no_requests': 'No pending requests.',
+    },
+    'हिंदी': {
+        # Authentication
+        'login': 'लॉगिन', 'register': 'रजिस्टर', 'logout': 'लॉग आउट',
+        'username': 'उपयोगकर्ता नाम', 'password': 'पासवर्ड',
+        'login_success': 'सफलतापूर्वक लॉग इन किया गया!',
+        'reg_success': 'पंजीकरण सफल! कृपया लॉग इन करें।',
+        'invalid_cred': 'अमान्य उपयोगकर्ता नाम या पासवर्ड।',
+        'user_exists': 'उपयोगकर्ता नाम पहले से मौजूद है।',
+        # Sidebar
+        'onboarding': 'ऑनबोर्डिंग', 'dashboard': 'डैशबोर्ड',
+        'skin_analyzer': 'त्वचा विश्लेषक', 'my_routine': 'मेरी दिनचर्या',
+        'marketplace': 'उत्पाद बाज़ार', 'my_kit': 'व्यक्तिगत किट',
+        'academy': 'स्किनकेयर अकादमी', 'forum': 'सामुदायिक मंच',
+        'expert_consult': 'विशेषज्ञ से परामर्श', 'hyper_advice': 'अति-व्यक्तिगत सलाह',
+        'ai_chatbot': 'एआई चैटबॉट', 'daily_checker': 'दैनिक दिनचर्या एआई चेकर',
+        'lang_toggle': 'भाषा',
+        # Onboarding
+        'setup_title': '2-मिनट ऑनबोर्डिंग सेटअप',
+        'full_name': 'पूरा नाम', 'age': 'आयु', 'location': 'स्थान (देश/शहर)',
+        'primary_concerns': 'प्राथमिक चिंताएं', 'skin_type': 'त्वचा का प्रकार',
+        'pref_lang': 'पसंदीदा भाषा', 'onboard_complete': 'ऑनबोर्डिंग पूर्ण!',
+        'onboard_btn': 'ऑनबोर्डिंग सहेजें',
+        # Dashboard
+        'welcome': 'स्वागत है,', 'skin_score': 'त्वचा स्कोर', 'routine_summary': 'त्वरित दिनचर्या सारांश',
+        'score_over_time': 'समय के साथ त्वचा स्कोर', 'start_analysis': 'त्वचा विश्लेषण शुरू करें',
+        'last_score': 'अंतिम स्कोर', 'last_analysis_date': 'अंतिम विश्लेषण तिथि',
+        'daily_pts': 'दैनिक अंक', 'total_pts': 'कुल अंक',
+        # Generic
+        'coming_soon': 'जल्द आ रहा है', 'download_report': 'रिपोर्ट डाउनलोड करें',
+        'save_kit': 'मेरी किट में सहेजें', 'post_question': 'प्रश्न पोस्ट करें',
+        'submit_request': 'अनुरोध सबमिट करें', 'simulate': 'सिम्युलेट करें',
+        'morning_routine': 'सुबह की दिनचर्या', 'evening_routine': 'शाम की दिनचर्या',
+        'completion': 'पूर्णता', 'streak': 'दिनचर्या स्ट्रीक',
+        'view_analysis_details': 'विश्लेषण विवरण देखें',
+        'points_earned': 'अर्जित अंक:', 'today_score': 'आज का दिनचर्या स्कोर',
+        'good_job': 'अच्छा काम! आपने अपनी दिनचर्या पूरी कर ली है।',
+        'more_work': 'आपने कुछ कदम छोड़ दिए। कल फिर से प्रयास करें!',
+        'analysis_header': 'आपका अति-व्यक्तिगत त्वचा विश्लेषण',
+        'detected_type': 'पता चला त्वचा प्रकार', 'current_score': 'वर्तमान त्वचा स्कोर',
+        'future_proj': 'भविष्य का स्कोर अनुमान', 'hydration': 'जलयोजन स्कोर',
+        'acne_risk': 'मुँहासे जोखिम %', 'pig_risk': 'पिगमेंटेशन जोखिम %',
+        'pore_vis': 'छिद्र दृश्यता अनुमान', 'sleep_impact': 'नींद का प्रभाव %',
+        'stress_impact': 'तनाव का प्रभाव %', 'recs': 'व्यक्तिगत सिफारिशें',
+        'lifestyle_actions': 'जीवनशैली कार्य', 'product_categories': 'उत्पाद श्रेणियाँ',
+        'analysis_not_found': 'कोई विश्लेषण नहीं मिला। कृपया पहले त्वचा विश्लेषक चलाएँ।',
+        'kit_empty': 'आपकी व्यक्तिगत किट खाली है। मार्केटप्लेस से उत्पाद सहेजें।',
+        'why_this_kit': 'यह किट आपके लिए क्यों अनुशंसित है',
+        'community_q': 'सामुदायिक प्रश्न और उत्तर',
+        'your_question': 'आपका प्रश्न', 'post': 'पोस्ट करें',
+        'new_post': 'एक नया प्रश्न पोस्ट करें', 'ask_expert': 'विशेषज्ञ से पूछें',
+        'pref_date_time': 'पसंदीदा तिथि/समय', 'short_note': 'छोटा नोट',
+        'requests_submitted': 'अनुरोध सबमिट किए गए', 'no_requests': 'कोई लंबित अनुरोध नहीं।',
+    }
+}
+
+def _tr(lang, key):
+    """(language, key) lookup into TRANSLATIONS, falling back to the key itself."""
+    return TRANSLATIONS[lang].get(key, key)
+
 def get_i18n(key):
     """Translates a key based on the current language in session state."""
-    lang = st.session_state.get('language', 'English')
-    translations = {
-        'English': {
-            # Authentication
-            'login': 'Login', 'register': 'Register', 'logout': 'Logout',
-            'username': 'Username', 'password': 'Password',
-            'login_success': 'Logged in successfully!',
-            'reg_success': 'Registration successful! Please log in.',
-            'invalid_cred': 'Invalid username or password.',
-            'user_exists': 'Username already exists.',
-            # Sidebar
-            'onboarding': 'Onboarding', 'dashboard': 'Dashboard',
-            'skin_analyzer': 'Skin Analyzer', 'my_routine': 'My Routine',
-            'marketplace': 'Product Marketplace', 'my_kit': 'Personalized Kit',
-            'academy': 'Skincare Academy', 'forum': 'Community Forum',
-            'expert_consult': 'Consult an Expert', 'hyper_advice': 'Hyper-Personalized Advice',
-            'ai_chatbot': 'AI Chatbot', 'daily_checker': 'Daily Routine AI Checker',
-            'lang_toggle': 'Language',
-            # Onboarding
-            'setup_title': '2-Minute Onboarding Setup',
-            'full_name': 'Full Name', 'age': 'Age', 'location': 'Location (Country/City)',
-            'primary_concerns': 'Primary Concerns', 'skin_type': 'Skin Type',
-            'pref_lang': 'Preferred Language', 'onboard_complete': 'Onboarding Complete!',
-            'onboard_btn': 'Save Onboarding',
-            # Dashboard
-            'welcome': 'Welcome,', 'skin_score': 'Skin Score', 'routine_summary': 'Quick Routine Summary',
-            'score_over_time': 'Skin Score over Time', 'start_analysis': 'Start Skin Analysis',
-            'last_score': 'Last Score', 'last_analysis_date': 'Last Analysis Date',
-            'daily_pts': 'Daily Points', 'total_pts': 'Total Points',
-            # Generic
-            'coming_soon': 'Coming Soon', 'download_report': 'Download Report',
-            'save_kit': 'Save to My Kit', 'post_question': 'Post Question',
-            'submit_request': 'Submit Request', 'simulate': 'Simulate',
-            'morning_routine': 'Morning Routine', 'evening_routine': 'Evening Routine',
-            'completion': 'Completion', 'streak': 'Routine Streak',
-            'view_analysis_details': 'View Analysis Details',
-            'points_earned': 'Points Earned:', 'today_score': "Today's Routine Score",
-            'good_job': 'Good job! You completed your routine.',
-            'more_work': 'You missed some steps. Try again tomorrow!',
-            'analysis_header': 'Your Hyper-Personalized Skin Analysis',
-            'detected_type': 'Detected Skin Type', 'current_score': 'Current Skin Score',
-            'future_proj': 'Future Score Projection', 'hydration': 'Hydration Score',
-            'acne_risk': 'Acne Risk %', 'pig_risk': 'Pigmentation Risk %',
-            'pore_vis': 'Pore Visibility Estimate', 'sleep_impact': 'Sleep Impact %',
-            'stress_impact': 'Stress Impact %', 'recs': 'Personalized Recommendations',
-            'lifestyle_actions': 'Lifestyle Actions', 'product_categories': 'Product Categories',
-            'analysis_not_found': 'No analysis found. Please run the Skin Analyzer first.',
-            'kit_empty': 'Your Personalized Kit is empty. Save products from the Marketplace.',
-            'why_this_kit': 'Why this Kit is Recommended for You',
-            'community_q': 'Community Questions & Answers',
-            'your_question': 'Your Question', 'post': 'Post',
-            'new_post': 'Post a New Question', 'ask_expert': 'Ask an Expert',
-            'pref_date_time': 'Preferred Date/Time', 'short_note': 'Short Note',
-            'requests_submitted': 'Submitted Requests', 'no_requests': 'No pending requests.',
-        },
-        'हिंदी': {
-            # Authentication
-            'login': 'लॉगिन', 'register': 'रजिस्टर', 'logout': 'लॉग आउट',
-            'username': 'उपयोगकर्ता नाम', 'password': 'पासवर्ड',
-            'login_success': 'सफलतापूर्वक लॉग इन किया गया!',
-            'reg_success': 'पंजीकरण सफल! कृपया लॉग इन करें।',
-            'invalid_cred': 'अमान्य उपयोगकर्ता नाम या पासवर्ड।',
-            'user_exists': 'उपयोगकर्ता नाम पहले से मौजूद है।',
-            # Sidebar
-            'onboarding': 'ऑनबोर्डिंग', 'dashboard': 'डैशबोर्ड',
-            'skin_analyzer': 'त्वचा विश्लेषक', 'my_routine': 'मेरी दिनचर्या',
-            'marketplace': 'उत्पाद बाज़ार', 'my_kit': 'व्यक्तिगत किट',
-            'academy': 'स्किनकेयर अकादमी', 'forum': 'सामुदायिक मंच',
-            'expert_consult': 'विशेषज्ञ से परामर्श', 'hyper_advice': 'अति-व्यक्तिगत सलाह',
-            'ai_chatbot': 'एआई चैटबॉट', 'daily_checker': 'दैनिक दिनचर्या एआई चेकर',
-            'lang_toggle': 'भाषा',
-            # Onboarding
-            'setup_title': '2-मिनट ऑनबोर्डिंग सेटअप',
-            'full_name': 'पूरा नाम', 'age': 'आयु', 'location': 'स्थान (देश/शहर)',
-            'primary_concerns': 'प्राथमिक चिंताएं', 'skin_type': 'त्वचा का प्रकार',
-            'pref_lang': 'पसंदीदा भाषा', 'onboard_complete': 'ऑनबोर्डिंग पूर्ण!',
-            'onboard_btn': 'ऑनबोर्डिंग सहेजें',
-            # Dashboard
-            'welcome': 'स्वागत है,', 'skin_score': 'त्वचा स्कोर', 'routine_summary': 'त्वरित दिनचर्या सारांश',
-            'score_over_time': 'समय के साथ त्वचा स्कोर', 'start_analysis': 'त्वचा विश्लेषण शुरू करें',
-            'last_score': 'अंतिम स्कोर', 'last_analysis_date': 'अंतिम विश्लेषण तिथि',
-            'daily_pts': 'दैनिक अंक', 'total_pts': 'कुल अंक',
-            # Generic
-            'coming_soon': 'जल्द आ रहा है', 'download_report': 'रिपोर्ट डाउनलोड करें',
-            'save_kit': 'मेरी किट में सहेजें', 'post_question': 'प्रश्न पोस्ट करें',
-            'submit_request': 'अनुरोध सबमिट करें', 'simulate': 'सिम्युलेट करें',
-            'morning_routine': 'सुबह की दिनचर्या', 'evening_routine': 'शाम की दिनचर्या',
-            'completion': 'पूर्णता', 'streak': 'दिनचर्या स्ट्रीक',
-            'view_analysis_details': 'विश्लेषण विवरण देखें',
-            'points_earned': 'अर्जित अंक:', 'today_score': 'आज का दिनचर्या स्कोर',
-            'good_job': 'अच्छा काम! आपने अपनी दिनचर्या पूरी कर ली है।',
-            'more_work': 'आपने कुछ कदम छोड़ दिए। कल फिर से प्रयास करें!',
-            'analysis_header': 'आपका अति-व्यक्तिगत त्वचा विश्लेषण',
-            'detected_type': 'पता चला त्वचा प्रकार', 'current_score': 'वर्तमान त्वचा स्कोर',
-            'future_proj': 'भविष्य का स्कोर अनुमान', 'hydration': 'जलयोजन स्कोर',
-            'acne_risk': 'मुँहासे जोखिम %', 'pig_risk': 'पिगमेंटेशन जोखिम %',
-            'pore_vis': 'छिद्र दृश्यता अनुमान', 'sleep_impact': 'नींद का प्रभाव %',
-            'stress_impact': 'तनाव का प्रभाव %', 'recs': 'व्यक्तिगत सिफारिशें',
-            'lifestyle_actions': 'जीवनशैली कार्य', 'product_categories': 'उत्पाद श्रेणियाँ',
-            'analysis_not_found': 'कोई विश्लेषण नहीं मिला। कृपया पहले त्वचा विश्लेषक चलाएँ।',
-            'kit_empty': 'आपकी व्यक्तिगत किट खाली है। मार्केटप्लेस से उत्पाद सहेजें।',
-            'why_this_kit': 'यह किट आपके लिए क्यों अनुशंसित है',
-            'community_q': 'सामुदायिक प्रश्न और उत्तर',
-            'your_question': 'आपका प्रश्न', 'post': 'पोस्ट करें',
-            'new_post': 'एक नया प्रश्न पोस्ट करें', 'ask_expert': 'विशेषज्ञ से पूछें',
-            'pref_date_time': 'पसंदीदा तिथि/समय', 'short_note': 'छोटा नोट',
-            'requests_submitted': 'अनुरोध सबमिट किए गए', 'no_requests': 'कोई लंबित अनुरोध नहीं।',
-        }
-    }
-    return translations[lang].get(key, key)
+    return _tr(st.session_state.get('language', 'English'), key)
 
 
 # --- Utility Functions ---
 
+# scrypt work factors: memory-hard, roughly 50ms per hash on commodity hardware
+SCRYPT_PARAMS = {'n': 2**14, 'r': 8, 'p': 1, 'dklen': 32}
+
 def hash_password(password, salt=None):
-    """Hashes a password using SHA256 with a salt."""
+    """Hashes a password using scrypt with a salt."""
     if salt is None:
-        salt = uuid.uuid4().hex
-    hashed_password = hashlib.sha256((password + salt).encode('utf-8')).hexdigest()
+        salt = secrets.token_hex(16)
+    hashed_password = hashlib.scrypt(password.encode(), salt=salt.encode(), **SCRYPT_PARAMS).hex()
     return hashed_password, salt
 
-def check_password(hashed_password, password, salt):
-    """Checks a password against a stored hash and salt."""
-    return hashed_password == hashlib.sha256((password + salt).encode('utf-8')).hexdigest()
+def check_password(hashed_password, password, salt, scheme='scrypt'):
+    """Checks a password against a stored hash and salt in constant time.
+
+    scheme='sha256' verifies records created before the scrypt migration.
+    """
+    if scheme == 'sha256':
+        candidate = hashlib.sha256(f"{password}{salt}".encode()).hexdigest()
+    else:
+        candidate, _ = hash_password(password, salt)
+    return hmac.compare_digest(hashed_password, candidate)
 
 def get_user_data(username):
     """Initializes or returns the user's entry in the main DATA store."""
     if username not in DATA:
-        DATA[username] = {
-            'onboarding': {},
-            'analysis_history': [],
-            'points': 0,
-            'routine': {'morning': [], 'evening': []},
-            'kit': [],
-            'daily_completion': {},
-            'forum_posts': [],
-            'expert_requests': [],
-        }
-        save_data(DATA_FILE, DATA)
+        DATA[username] = new_user_data()
+        save_user_data(username)
     return DATA[username]
 
+def save_user_data(username):
+    """Marks one user's file dirty; a save rewrites only that user's data, not everyone's."""
+    save_data(user_data_path(username), _user_record(username, DATA[username]))
+
 def update_user_points(username, points):
-    """Updates user's total points and saves the data."""
-    DATA[username]['points'] = DATA[username].get('points', 0) + points
-    save_data(DATA_FILE, DATA)
-    return DATA[username]['points']
+    """Updates user's total points, logged as an event carrying the new total."""
+    total = DATA[username].get('points', 0) + points
+    append_event(username, {'type': 'points', 'total': total}) # The absolute total keeps replay idempotent
+    return total
+
+def _clamp(value, lo, hi):
+    """Limits value to [lo, hi] with plain comparisons instead of nested min/max calls."""
+    return lo if value < lo else hi if value > hi else value
+
+def parse_timestamp(iso_timestamp):
+    """Parses a stored ISO timestamp."""
+    return datetime.fromisoformat(iso_timestamp)
+
+def format_timestamp(iso_timestamp, fmt):
+    """Formats a stored ISO timestamp for display."""
+    return parse_timestamp(iso_timestamp).strftime(fmt)
+
+def _today_str():
+    """Today's ISO date, memoized on the session and recomputed once the date rolls over."""
+    today = date.today()
+    cached = st.session_state.get('_today_str')
+    if cached is None or cached[0] != today:
+        cached = (today, today.isoformat())
+        st.session_state['_today_str'] = cached
+    return cached[1]
 
 def get_current_user():
     """Returns the current logged-in username or None."""
@@ -221,9 +473,9 @@ def get_current_user():
 
 # --- Authentication Pages ---
 
-def login_register_page():
-    """The main entry page for login and registration."""
-    st.markdown(f"""
+# Static style blocks for the login page and sidebar. They are still sent on every rerun:
+# Streamlit drops any element a rerun doesn't re-emit, so skipping them would unstyle the page.
+LOGIN_CSS = f"""
         <style>
             .stApp {{
                 background-color: {DEFAULT_THEME_COLOR};
@@ -234,24 +486,56 @@ def login_register_page():
                 border-radius: 5px;
             }}
         </style>
-    """, unsafe_allow_html=True)
+"""
+SIDEBAR_CSS = f"""
+        <style>
+            [data-testid="stSidebar"] {{
+                background-color: {DEFAULT_THEME_COLOR};
+            }}
+            .sidebar .st-bb {{ /* Streamlit Cloud compatibility for sidebar selector */
+                color: {ACCENT_COLOR};
+            }}
+            div[data-testid="stSidebarNav"] li a {{
+                color: #333333; /* Default text color */
+            }}
+            div[data-testid="stSidebarNav"] li .current-page a {{
+                background-color: {ACCENT_COLOR};
+                color: white;
+                border-radius: 5px;
+            }}
+        </style>
+"""
+
+
+def login_register_page():
+    """The main entry page for login and registration."""
+    st.markdown(LOGIN_CSS, unsafe_allow_html=True)
     
     st.title("Welcome to Your Skincare AI Assistant")
     st.write("Please **Login** or **Register** to continue.")
     
+    # Both forms share these labels; resolve each once
+    t_login, t_register, t_username, t_password = (get_i18n(k) for k in ('login', 'register', 'username', 'password'))
+    
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader(get_i18n('login'))
+        st.subheader(t_login)
         with st.form("login_form"):
-            username = st.text_input(get_i18n('username'))
-            password = st.text_input(get_i18n('password'), type="password")
-            login_submitted = st.form_submit_button(get_i18n('login'))
+            username = st.text_input(t_username)
+            password = st.text_input(t_password, type="password")
+            login_submitted = st.form_submit_button(t_login)
             
             if login_submitted:
                 if username in USERS:
                     user_record = USERS[username]
-                    if check_password(user_record['password'], password, user_record['salt']):
+                    scheme = user_record.get('scheme', 'sha256')
+                    if check_password(user_record['password'], password, user_record['salt'], scheme):
+                        if scheme != 'scrypt':
+                            # Lazily upgrade legacy SHA256 records now that we know the plaintext
+                            hashed_pass, salt = hash_password(password)
+                            user_record.update({'password': hashed_pass, 'salt': salt, 'scheme': 'scrypt'})
+                            save_data(USERS_FILE, USERS)
                         st.session_state['logged_in_user'] = username
                         st.session_state['page'] = 'Dashboard' # Default to Dashboard after login
                         st.success(get_i18n('login_success'))
@@ -262,11 +546,11 @@ def login_register_page():
                     st.error(get_i18n('invalid_cred'))
                     
     with col2:
-        st.subheader(get_i18n('register'))
+        st.subheader(t_register)
         with st.form("register_form"):
-            new_username = st.text_input(get_i18n('username'), key='reg_user')
-            new_password = st.text_input(get_i18n('password'), type="password", key='reg_pass')
-            register_submitted = st.form_submit_button(get_i18n('register'))
+            new_username = st.text_input(t_username, key='reg_user')
+            new_password = st.text_input(t_password, type="password", key='reg_pass')
+            register_submitted = st.form_submit_button(t_register)
             
             if register_submitted:
                 if new_username in USERS:
@@ -275,33 +559,33 @@ def login_register_page():
                     st.error("Username and password cannot be empty.")
                 else:
                     hashed_pass, salt = hash_password(new_password)
-                    USERS[new_username] = {'password': hashed_pass, 'salt': salt}
+                    USERS[new_username] = {'password': hashed_pass, 'salt': salt, 'scheme': 'scrypt'}
                     save_data(USERS_FILE, USERS)
                     get_user_data(new_username) # Initialize user data
                     st.success(get_i18n('reg_success'))
 
 # --- Sidebar and Main App Layout ---
 
+# (i18n key, page name) pairs in sidebar order
+_MENU_KEYS = [
+    ('onboarding', 'Onboarding'),
+    ('dashboard', 'Dashboard'),
+    ('skin_analyzer', 'Skin Analyzer'),
+    ('my_routine', 'My Routine'),
+    ('marketplace', 'Product Marketplace'),
+    ('my_kit', 'Personalized Kit'),
+    ('academy', 'Skincare Academy'),
+    ('forum', 'Community Forum'),
+    ('expert_consult', 'Consult an Expert'),
+    ('hyper_advice', 'Hyper-Personalized Advice'),
+    ('ai_chatbot', 'AI Chatbot'),
+    ('daily_checker', 'Daily Routine AI Checker'),
+]
+_PAGE_TO_IDX = {page: i for i, (_, page) in enumerate(_MENU_KEYS)}
+
 def sidebar_menu():
     """Shows the main sidebar navigation after login."""
-    st.sidebar.markdown(f"""
-        <style>
-            [data-testid="stSidebar"] {{
-                background-color: {DEFAULT_THEME_COLOR};
-            }}
-            .sidebar .st-bb {{ /* Streamlit Cloud compatibility for sidebar selector */
-                color: {ACCENT_COLOR};
-            }}
-            div[data-testid="stSidebarNav"] li a {{
-                color: #333333; /* Default text color */
-            }}
-            div[data-testid="stSidebarNav"] li .current-page a {{
-                background-color: {ACCENT_COLOR};
-                color: white;
-                border-radius: 5px;
-            }}
-        </style>
-    """, unsafe_allow_html=True)
+    st.sidebar.markdown(SIDEBAR_CSS, unsafe_allow_html=True)
 
     username = get_current_user()
     if not username:
@@ -311,24 +595,10 @@ def sidebar_menu():
     st.sidebar.subheader(f"👋 {get_i18n('welcome')} {username}")
 
     # Language Toggle
-    lang_options = ['English', 'हिंदी']
-    selected_lang = st.sidebar.selectbox(get_i18n('lang_toggle'), lang_options, key='lang_select', index=lang_options.index(st.session_state.get('language', 'English')))
+    selected_lang = st.sidebar.selectbox(get_i18n('lang_toggle'), LANGUAGES, key='lang_select', index=LANGUAGES_IDX.get(st.session_state.get('language'), 0))
     st.session_state['language'] = selected_lang
 
-    menu_items = {
-        get_i18n('onboarding'): 'Onboarding',
-        get_i18n('dashboard'): 'Dashboard',
-        get_i18n('skin_analyzer'): 'Skin Analyzer',
-        get_i18n('my_routine'): 'My Routine',
-        get_i18n('marketplace'): 'Product Marketplace',
-        get_i18n('my_kit'): 'Personalized Kit',
-        get_i18n('academy'): 'Skincare Academy',
-        get_i18n('forum'): 'Community Forum',
-        get_i18n('expert_consult'): 'Consult an Expert',
-        get_i18n('hyper_advice'): 'Hyper-Personalized Advice',
-        get_i18n('ai_chatbot'): 'AI Chatbot',
-        get_i18n('daily_checker'): 'Daily Routine AI Checker',
-    }
+    menu_items = {_tr(selected_lang, key): page for key, page in _MENU_KEYS}
     
     # Set initial page if not set
     if 'page' not in st.session_state:
@@ -339,7 +609,7 @@ def sidebar_menu():
             st.session_state['page'] = 'Onboarding'
 
     # Display the menu using radio buttons for the most control
-    selected_menu = st.sidebar.radio("Navigation", list(menu_items.keys()), index=list(menu_items.values()).index(st.session_state['page']))
+    selected_menu = st.sidebar.radio("Navigation", list(menu_items.keys()), index=_PAGE_TO_IDX[st.session_state['page']])
     st.session_state['page'] = menu_items[selected_menu]
 
     st.sidebar.markdown("---")
@@ -354,6 +624,10 @@ def sidebar_menu():
 CONCERNS = ['Acne', 'Pigmentation', 'Wrinkles', 'Sensitivity', 'Dryness', 'Oily']
 SKIN_TYPES = ['Normal', 'Dry', 'Oily', 'Combination', 'Sensitive']
 LANGUAGES = ['English', 'हिंदी']
+# Option -> position maps for selectbox defaults (O(1) instead of list.index scans)
+SKIN_TYPE_IDX = {t: i for i, t in enumerate(SKIN_TYPES)}
+LANGUAGES_IDX = {l: i for i, l in enumerate(LANGUAGES)}
+CONCERNS_IDX = {c: i for i, c in enumerate(CONCERNS)}
 
 def onboarding_page():
     """Page 1: Collects initial user setup data."""
@@ -375,14 +649,14 @@ def onboarding_page():
         location = st.text_input(get_i18n('location'), value=onboard_data.get('location', ''))
         
         # Multi-select for concerns
-        default_concerns = onboard_data.get('primary_concerns', [])
+        default_concerns = [c for c in onboard_data.get('primary_concerns', []) if c in CONCERNS_IDX]
         primary_concerns = st.multiselect(get_i18n('primary_concerns'), CONCERNS, default=default_concerns)
         
         # Dropdowns
-        default_skin_type_index = SKIN_TYPES.index(onboard_data.get('skin_type', SKIN_TYPES[0]))
+        default_skin_type_index = SKIN_TYPE_IDX.get(onboard_data.get('skin_type'), 0)
         skin_type = st.selectbox(get_i18n('skin_type'), SKIN_TYPES, index=default_skin_type_index)
         
-        default_lang_index = LANGUAGES.index(onboard_data.get('preferred_language', LANGUAGES[0]))
+        default_lang_index = LANGUAGES_IDX.get(onboard_data.get('preferred_language'), 0)
         preferred_language = st.selectbox(get_i18n('pref_lang'), LANGUAGES, index=default_lang_index)
         
         submitted = st.form_submit_button(get_i18n('onboard_btn'))
@@ -397,11 +671,47 @@ def onboarding_page():
                 'preferred_language': preferred_language,
                 'timestamp': datetime.now().isoformat()
             }
-            save_data(DATA_FILE, DATA)
+            save_user_data(username)
             st.success("Onboarding data saved successfully!")
             st.session_state['page'] = 'Dashboard' # Move to Dashboard after setup
             st.rerun()
 
+@st.cache_data(max_entries=64, show_spinner=False) # One live key per user; old keys age out
+def _score_history_spec(history_key, title, _history):
+    """Builds the Vega-Lite spec for the score-over-time chart, cached on history_key."""
+    # Imported lazily: only this chart needs pandas/altair, so cold starts skip them
+    import pandas as pd
+    import altair as alt
+
+    # Ensure only unique dates for charting: history is in timestamp order, so later
+    # analyses on the same day overwrite earlier ones (keep='last' semantics). The key is the
+    # ISO date prefix, so no per-row datetime parsing is needed.
+    latest = {}
+    for a in _history:
+        latest[a['timestamp'][:10]] = a['current_score']
+    history_df = pd.DataFrame.from_records(list(latest.items()), columns=['Date', 'Score'])
+    # Vectorized conversions: pandas' C ISO parser for dates, compact ints for scores
+    history_df['Date'] = pd.to_datetime(history_df['Date'], format='%Y-%m-%d')
+    history_df['Score'] = history_df['Score'].astype('int16')
+    
+    chart = alt.Chart(history_df).mark_line(point=True).encode(
+        x=alt.X('Date', axis=alt.Axis(title='Date', format='%b %d')),
+        y=alt.Y('Score', axis=alt.Axis(title='Skin Score (0-100)'), scale=alt.Scale(domain=[0, 100])),
+        tooltip=['Date', 'Score']
+    ).properties(
+        title=title
+    ).interactive()
+    # The serialized spec is plain data, so it caches cleanly and skips Altair on later reruns
+    return chart.to_dict()
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _routine_streak(completed_days, today_ordinal):
+    """Counts consecutive completed days ending yesterday; days are date ordinals."""
+    streak = 0
+    while today_ordinal - 1 - streak in completed_days:
+        streak += 1
+    return streak
+
 def dashboard_page():
     """Page 2: Shows user a summary of their data."""
     username = get_current_user()
@@ -421,7 +731,7 @@ def dashboard_page():
     col1, col2, col3, col4 = st.columns(4)
     
     last_score = last_analysis['current_score'] if last_analysis else 'N/A'
-    last_date = datetime.fromisoformat(last_analysis['timestamp']).strftime('%b %d, %Y') if last_analysis else 'N/A'
+    last_date = format_timestamp(last_analysis['timestamp'], '%b %d, %Y') if last_analysis else 'N/A'
     
     col1.metric(get_i18n('last_score'), last_score, delta="Score (0-100)")
     col2.metric(get_i18n('total_pts'), user_data['points'])
@@ -436,16 +746,13 @@ def dashboard_page():
     yesterday_str = yesterday.isoformat()
     yesterday_completed = daily_completions.get(yesterday_str, {}).get('is_complete', False)
     
-    # Simplistic streak calculation: just check if yesterday was done and count from there
-    # This is a placeholder for a more robust DB-backed calculation.
+    # Streak: consecutive completed days counting back from yesterday
     streak_count = 0
-    if daily_completions.get((today - timedelta(days=1)).isoformat(), {}).get('is_complete', False):
-        for i in range(1, 100): # Max 100 day check
-            day_str = (today - timedelta(days=i)).isoformat()
-            if daily_completions.get(day_str, {}).get('is_complete', False):
-                streak_count += 1
-            else:
-                break
+    if yesterday_completed:
+        completed_days = frozenset(
+            date.fromisoformat(day).toordinal() for day, entry in daily_completions.items() if entry.get('is_complete')
+        )
+        streak_count = _routine_streak(completed_days, today.toordinal())
     
     col4.metric(get_i18n('streak'), streak_count)
 
@@ -455,25 +762,15 @@ def dashboard_page():
     col5, col6 = st.columns([3, 1])
 
     with col5:
-        st.subheader(get_i18n('score_over_time'))
+        chart_title = get_i18n('score_over_time') # Used for the heading and the chart title
+        st.subheader(chart_title)
         
-        if user_data['analysis_history']:
-            history_df = pd.DataFrame([
-                {'Date': datetime.fromisoformat(a['timestamp']).date(), 'Score': a['current_score']}
-                for a in user_data['analysis_history']
-            ])
-            # Ensure only unique dates for charting
-            history_df = history_df.drop_duplicates(subset=['Date'], keep='last')
-            
-            chart = alt.Chart(history_df).mark_line(point=True).encode(
-                x=alt.X('Date', axis=alt.Axis(title='Date', format='%b %d')),
-                y=alt.Y('Score', axis=alt.Axis(title='Skin Score (0-100)', domain=[0, 100])),
-                tooltip=['Date', 'Score']
-            ).properties(
-                title=get_i18n('score_over_time')
-            ).interactive()
-            
-            st.altair_chart(chart, use_container_width=True)
+        history = user_data['analysis_history']
+        if history:
+            # History only grows by appending, so its length + last timestamp identify its contents
+            history_key = (username, len(history), history[-1]['timestamp'])
+            spec = _score_history_spec(history_key, chart_title, history)
+            st.vega_lite_chart(spec, use_container_width=True)
         else:
             st.info("Run your first **Skin Analyzer** to see your score history!")
             
@@ -502,10 +799,21 @@ def dashboard_page():
         st.session_state['page'] = 'Skin Analyzer'
         st.rerun()
 
-def create_pdf_report(analysis_data, username):
-    """Creates a basic PDF report using fpdf2."""
-    
-    class PDF(FPDF):
+def _report_pdf_class():
+    """Defines the report's FPDF subclass, importing fpdf only when a report is actually built.
+
+    The class is redefined per built report; _cached_pdf_report caches the bytes, so that only
+    happens when a report is missing from the cache.
+    """
+    from fpdf import FPDF
+
+    class ReportPDF(FPDF):
+        """fpdf2 document with the report's header, footer and section helpers."""
+
+        def __init__(self, username):
+            super().__init__()
+            self.username = username
+
         def header(self):
             self.set_font('Arial', 'B', 15)
             self.cell(0, 10, 'Hyper-Personalized Skin Analysis Report', 0, 1, 'C')
@@ -514,7 +822,7 @@ def create_pdf_report(analysis_data, username):
         def footer(self):
             self.set_y(-15)
             self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Page {self.page_no()}/{{nb}} | Report for {username}', 0, 0, 'C')
+            self.cell(0, 10, f'Page {self.page_no()}/{{nb}} | Report for {self.username}', 0, 0, 'C')
 
         def chapter_title(self, title):
             self.set_font('Arial', 'B', 12)
@@ -527,13 +835,17 @@ def create_pdf_report(analysis_data, username):
             self.multi_cell(0, 5, body)
             self.ln()
 
-    pdf = PDF()
+    return ReportPDF
+
+def create_pdf_report(analysis_data, username):
+    """Creates a basic PDF report using fpdf2."""
+    pdf = _report_pdf_class()(username)
     pdf.alias_nb_pages()
     pdf.add_page()
     
     # Report Meta
     pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 5, f"Date: {datetime.fromisoformat(analysis_data['timestamp']).strftime('%Y-%m-%d %H:%M')}", 0, 1)
+    pdf.cell(0, 5, f"Date: {format_timestamp(analysis_data['timestamp'], '%Y-%m-%d %H:%M')}", 0, 1)
     pdf.ln(5)
 
     # Summary
@@ -560,35 +872,61 @@ def create_pdf_report(analysis_data, username):
     # Recommendations
     pdf.chapter_title("3. Personalized Routine & Recommendations")
     
+    # Each block is laid out with a single multi_cell call rather than one cell per line
     pdf.set_font('Arial', 'B', 10)
     pdf.cell(0, 5, "Morning Routine:", 0, 1)
     pdf.set_font('Arial', '', 10)
-    for step in analysis_data['routine_morning']:
-        pdf.cell(0, 5, f"- {step}", 0, 1)
+    pdf.multi_cell(0, 5, "\n".join(f"- {step}" for step in analysis_data['routine_morning']))
     pdf.ln(2)
 
     pdf.set_font('Arial', 'B', 10)
     pdf.cell(0, 5, "Evening Routine:", 0, 1)
     pdf.set_font('Arial', '', 10)
-    for step in analysis_data['routine_evening']:
-        pdf.cell(0, 5, f"- {step}", 0, 1)
+    pdf.multi_cell(0, 5, "\n".join(f"- {step}" for step in analysis_data['routine_evening']))
     pdf.ln(2)
     
+    recommendations = analysis_data['recommendations']
     pdf.set_font('Arial', 'B', 10)
     pdf.cell(0, 5, "Product Categories:", 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.chapter_body(", ".join(analysis_data['recommendations']['product_categories']))
+    pdf.chapter_body(", ".join(recommendations['product_categories']))
 
     pdf.set_font('Arial', 'B', 10)
     pdf.cell(0, 5, "Lifestyle Actions:", 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.chapter_body(analysis_data['recommendations']['lifestyle_actions'])
-
-
-    # Save to BytesIO for Streamlit download
-    pdf_output = pdf.output(dest='S').encode('latin1') # 'S' returns the document as a string (bytes)
-
-    return pdf_output
+    pdf.chapter_body(recommendations['lifestyle_actions'])
+
+
+    # Save to BytesIO for Streamlit download (fpdf2 writes bytes straight into a file-like target)
+    buffer = io.BytesIO()
+    pdf.output(buffer)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=16, show_spinner=False) # Keyed per analysis, so bound it to recent reports
+def _cached_pdf_report(analysis_json, username):
+    """Report bytes for one analysis, cached on its canonical JSON so any content change rebuilds it."""
+    return create_pdf_report(json.loads(analysis_json), username)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _decode_image(img_bytes, max_side):
+    """Decodes uploaded image bytes to an RGB uint8 array at most max_side pixels on each edge."""
+    image = Image.open(io.BytesIO(img_bytes))
+    image.draft('RGB', (max_side, max_side)) # Lets the JPEG decoder downscale while decoding
+    # Convert to RGB (in case it's a PNG with transparency)
+    image = image.convert('RGB')
+    image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
+
+def _selfie_preview_html(uploaded_file):
+    """<img> tag for the selfie preview, JPEG/base64-encoded once per upload and kept in the session."""
+    cached = st.session_state.get('selfie_preview')
+    if cached is not None and cached[0] == uploaded_file.file_id:
+        return cached[1]
+    # st.image would re-encode the array to PNG on every rerun; a data URI is built once and reused
+    buffer = io.BytesIO()
+    Image.fromarray(_decode_image(uploaded_file.getvalue(), 768)).save(buffer, format='JPEG', quality=85)
+    b64 = base64.b64encode(buffer.getvalue()).decode('ascii')
+    preview = f'<img src="data:image/jpeg;base64,{b64}" style="width:100%" alt="Your Selfie"/>'
+    st.session_state['selfie_preview'] = (uploaded_file.file_id, preview)
+    return preview
 
 def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
     """
@@ -597,21 +935,39 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
     Future development: Replace this with a function that calls a local TFLite or PyTorch model:
     e.g., model.predict(preprocessed_image).
     """
+    onboarding = user_data['onboarding']
+    analysis_results = _analyze(
+        uploaded_file.getvalue(),
+        tuple(sorted(lifestyle_factors.items())),
+        onboarding['skin_type'],
+        tuple(onboarding['primary_concerns']),
+    )
+    # st.cache_data hands back a copy, so stamping the run time here never leaks into the cache
+    analysis_results['timestamp'] = datetime.now().isoformat()
+    return analysis_results
+
+@st.cache_data(show_spinner=False)
+def _analyze(img_bytes, lifestyle_tuple, onboard_skin_type, primary_concerns):
+    """Deterministic scoring behind pseudo_analyze_image, cached on the image bytes and inputs."""
+    lifestyle_factors = dict(lifestyle_tuple)
     
     # 1. Image Feature Extraction (Pseudo)
     try:
-        image = Image.open(uploaded_file)
-        # Convert to RGB (in case it's a PNG with transparency)
-        image = image.convert('RGB')
+        # Mean/std statistics are stable under downscaling, so bound the work regardless of upload size
+        arr = _decode_image(img_bytes, 256)
         
-        # Simple RGB Mean and Contrast
-        rgb_mean = [sum(c) / (image.width * image.height) for c in image.split()]
-        avg_brightness = sum(rgb_mean) / 3
+        # Simple RGB Mean and Contrast from integer running sums: one reduction for the channel
+        # sums, one for the sum of squares, and no float temporaries the size of the image
+        pixels = arr.reshape(-1, 3)
+        n_values = pixels.size
+        channel_sums = pixels.sum(axis=0, dtype=np.int64)
+        sum_of_squares = int(np.einsum('ij,ij->', pixels, pixels, dtype=np.int64))
+        rgb_mean = channel_sums / pixels.shape[0]
+        avg_brightness = float(channel_sums.sum()) / n_values
+        pixel_std = max(0.0, sum_of_squares / n_values - avg_brightness ** 2) ** 0.5
         
-        # Simple Contrast (placeholder: standard deviation of pixel values)
-        # Real contrast requires more complex histogram analysis
-        # For simplicity, we'll use a hardcoded value based on brightness for the demo
-        contrast_heuristic = 0.5 if avg_brightness < 100 or avg_brightness > 200 else 1.0
+        # Simple Contrast: standard deviation of pixel values, mapped to 0.5 (high contrast) .. 1.0 (flat)
+        contrast_heuristic = 1.0 - min(0.5, pixel_std / 255.0)
         
         # Skin Tone Heuristic (Pseudo-detection)
         if rgb_mean[0] > rgb_mean[1] * 1.1 and rgb_mean[0] > rgb_mean[2] * 1.1:
@@ -648,25 +1004,24 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
     
     # Final Score (0-100)
     current_score = int((base_image_score * 0.4 + lifestyle_impact_score * 0.6) * 100 * (1/redness_factor))
-    current_score = max(50, min(95, current_score)) # Clamp between 50 and 95 for realism
+    current_score = _clamp(current_score, 50, 95) # Clamp between 50 and 95 for realism
 
     # 4. Detailed Breakdown Generation (Deterministic based on scores)
     
     # Hydration
     hydration_score = int((water_score * 0.6 + avg_brightness/255 * 0.4) * 100)
-    hydration_score = max(50, min(99, hydration_score))
+    hydration_score = _clamp(hydration_score, 50, 99)
 
     # Acne Risk
     # High oil (if skin type is oily) + high stress + poor diet = high risk
-    onboard_skin_type = user_data['onboarding']['skin_type']
     base_risk = 50 - (current_score / 2) # Base risk inverse to overall score
     if onboard_skin_type in ['Oily', 'Combination']: base_risk += 10
     acne_risk_pct = int(base_risk + (1-stress_score) * 15 + (1-diet_score) * 10)
-    acne_risk_pct = min(90, max(10, acne_risk_pct))
+    acne_risk_pct = _clamp(acne_risk_pct, 10, 90)
 
     # Pigmentation Risk (Placeholder based on redness and overall skin quality)
     pigmentation_risk_pct = int(20 + (1-base_image_score) * 15 + (1-water_score) * 10)
-    pigmentation_risk_pct = min(70, max(5, pigmentation_risk_pct))
+    pigmentation_risk_pct = _clamp(pigmentation_risk_pct, 5, 70)
 
     # Future Projection: Assume improvement if current score is low and lifestyle is good.
     future_delta = int((lifestyle_impact_score - 0.5) * 20) # Max +- 10 points
@@ -675,17 +1030,14 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
     proj_30 = min(100, current_score + max(0, future_delta))
     proj_90 = min(100, current_score + max(0, future_delta * 2))
     
-    # Explanation
-    explanation = f"Your score is **{current_score}**. The image analysis detected a fair quality skin base, but a higher **{int(avg_brightness/255 * 100)}% average brightness** which can be a sign of mild dryness/redness. The most significant factor impacting your score is your **Stress Level** (contributing {int((1-stress_score)*100)}% to the negative impact). Improvements in sleep and stress management are projected to increase your score significantly in 90 days."
-
     # Personalized Routine (Based on concerns and scores)
     morning_routine = ["Cleanse: Gentle Hydrating Cleanser", "Treat: Vitamin C Serum", "Protect: SPF 30+ Sunscreen"]
     evening_routine = ["Cleanse: Double Cleanse (Oil + Foam)", "Treat: Niacinamide Serum", "Moisturize: Barrier Repair Cream"]
     
     # Adjust routine based on concerns
-    if 'Acne' in user_data['onboarding']['primary_concerns'] or acne_risk_pct > 50:
+    if 'Acne' in primary_concerns or acne_risk_pct > 50:
         evening_routine[1] = "Treat: Salicylic Acid (BHA) Serum"
-    if 'Wrinkles' in user_data['onboarding']['primary_concerns']:
+    if 'Wrinkles' in primary_concerns:
         evening_routine.append("Treat: Retinoid Cream (3x/week)")
         
     # Recommendations
@@ -694,7 +1046,6 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
 
     # Return the full analysis dictionary
     analysis_results = {
-        'timestamp': datetime.now().isoformat(),
         'image_features': {'avg_brightness': avg_brightness, 'redness_factor': redness_factor},
         'lifestyle_factors': lifestyle_factors,
         'detected_skin_type': onboard_skin_type, # Use the self-reported one for now
@@ -702,7 +1053,6 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
         'future_score_proj_7': proj_7,
         'future_score_proj_30': proj_30,
         'future_score_proj_90': proj_90,
-        'explanation': explanation,
         'hydration_score': hydration_score,
         'acne_risk_pct': acne_risk_pct,
         'pigmentation_risk_pct': pigmentation_risk_pct,
@@ -719,6 +1069,11 @@ def pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data):
     
     return analysis_results
 
+def render_explanation(analysis):
+    """Explanation text for an analysis, built from its stored numbers only when the results panel shows it."""
+    brightness_pct = int(analysis['image_features']['avg_brightness'] / 255 * 100)
+    return f"Your score is **{analysis['current_score']}**. The image analysis detected a fair quality skin base, but a higher **{brightness_pct}% average brightness** which can be a sign of mild dryness/redness. The most significant factor impacting your score is your **Stress Level** (contributing {analysis['stress_impact_pct']}% to the negative impact). Improvements in sleep and stress management are projected to increase your score significantly in 90 days."
+
 def skin_analyzer_page():
     """Page 3: Skin Analyzer - pseudo ML function and report download."""
     username = get_current_user()
@@ -751,8 +1106,8 @@ def skin_analyzer_page():
     with col_img:
         st.subheader("Uploaded Image")
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Your Selfie", use_column_width=True)
+            st.markdown(_selfie_preview_html(uploaded_file), unsafe_allow_html=True)
+            st.caption("Your Selfie")
         else:
             st.image("https://via.placeholder.com/300x300.png?text=Upload+Selfie", use_column_width=True)
 
@@ -767,13 +1122,18 @@ def skin_analyzer_page():
             analysis_results = pseudo_analyze_image(uploaded_file, lifestyle_factors, user_data)
             
             # Save results
-            user_data['analysis_history'].append(analysis_results)
+            history = user_data['analysis_history']
+            history.append(analysis_results)
+            if len(history) > MAX_ANALYSIS_HISTORY:
+                # Keep the user file (rewritten on every save) bounded; the overflow is archived, not lost
+                if archive_analyses(username, history[:-MAX_ANALYSIS_HISTORY]):
+                    del history[:-MAX_ANALYSIS_HISTORY]
             update_user_points(username, 10) # +10 points for each analysis
-            save_data(DATA_FILE, DATA)
+            save_user_data(username)
             st.session_state['last_analysis'] = analysis_results
             st.success("Analysis Complete! +10 Points Earned.")
             st.balloons()
-            st.rerun() # Rerun to display results clearly
+            # No st.rerun(): the results panel below reads last_analysis in this same run
 
     if 'last_analysis' in st.session_state or user_data['analysis_history']:
         # Always use the latest analysis if available
@@ -781,28 +1141,34 @@ def skin_analyzer_page():
         st.markdown("---")
         st.header(get_i18n('analysis_header'))
         
+        # Resolve the metric labels once for the whole results panel
+        (t_current_score, t_detected_type, t_future_proj, t_hydration, t_sleep_impact,
+         t_acne_risk, t_stress_impact, t_pig_risk, t_pore_vis) = (get_i18n(k) for k in (
+            'current_score', 'detected_type', 'future_proj', 'hydration', 'sleep_impact',
+            'acne_risk', 'stress_impact', 'pig_risk', 'pore_vis'))
+        
         # 1. Summary
         col_s1, col_s2, col_s3 = st.columns(3)
-        col_s1.metric(get_i18n('current_score'), f"{current_analysis['current_score']}/100")
-        col_s2.metric(get_i18n('detected_type'), current_analysis['detected_skin_type'])
-        col_s3.metric(get_i18n('future_proj'), f"{current_analysis['future_score_proj_90']} (90 days)")
+        col_s1.metric(t_current_score, f"{current_analysis['current_score']}/100")
+        col_s2.metric(t_detected_type, current_analysis['detected_skin_type'])
+        col_s3.metric(t_future_proj, f"{current_analysis['future_score_proj_90']} (90 days)")
         
         st.markdown("---")
         st.subheader("Analysis Explanation")
-        st.info(current_analysis['explanation'])
+        st.info(render_explanation(current_analysis))
 
         # 2. Detailed Breakdown
         st.subheader("Detailed Breakdown")
         
         col_d1, col_d2, col_d3 = st.columns(3)
-        col_d1.metric(get_i18n('hydration'), f"{current_analysis['hydration_score']}%")
-        col_d1.metric(get_i18n('sleep_impact'), f"{current_analysis['sleep_impact_pct']}%")
+        col_d1.metric(t_hydration, f"{current_analysis['hydration_score']}%")
+        col_d1.metric(t_sleep_impact, f"{current_analysis['sleep_impact_pct']}%")
         
-        col_d2.metric(get_i18n('acne_risk'), f"{current_analysis['acne_risk_pct']}%")
-        col_d2.metric(get_i18n('stress_impact'), f"{current_analysis['stress_impact_pct']}%")
+        col_d2.metric(t_acne_risk, f"{current_analysis['acne_risk_pct']}%")
+        col_d2.metric(t_stress_impact, f"{current_analysis['stress_impact_pct']}%")
         
-        col_d3.metric(get_i18n('pig_risk'), f"{current_analysis['pigmentation_risk_pct']}%")
-        col_d3.metric(get_i18n('pore_vis'), current_analysis['pore_visibility_estimate'])
+        col_d3.metric(t_pig_risk, f"{current_analysis['pigmentation_risk_pct']}%")
+        col_d3.metric(t_pore_vis, current_analysis['pore_visibility_estimate'])
 
         st.markdown("---")
         # 3. Recommendations
@@ -818,12 +1184,12 @@ def skin_analyzer_page():
             
         # 4. Download Report
         st.markdown("---")
-        pdf_bytes = create_pdf_report(current_analysis, username)
+        pdf_bytes = _cached_pdf_report(json.dumps(current_analysis, sort_keys=True), username)
         
         st.download_button(
             label=get_i18n('download_report'),
             data=pdf_bytes,
-            file_name=f"SkinAI_Report_{username}_{date.today().isoformat()}.pdf",
+            file_name=f"SkinAI_Report_{username}_{_today_str()}.pdf",
             mime="application/pdf",
             use_container_width=True
         )
@@ -845,7 +1211,7 @@ def my_routine_page():
         'evening': last_analysis['routine_evening']
     }
     
-    st.subheader(f"Your Current Hyper-Personalized Routine (From last analysis on {datetime.fromisoformat(last_analysis['timestamp']).strftime('%b %d, %Y')})")
+    st.subheader(f"Your Current Hyper-Personalized Routine (From last analysis on {format_timestamp(last_analysis['timestamp'], '%b %d, %Y')})")
     
     col_score, col_points = st.columns(2)
     col_score.metric("Total Points", user_data['points'])
@@ -853,8 +1219,10 @@ def my_routine_page():
     
     st.markdown("---")
     
-    today_str = date.today().isoformat()
-    daily_completion = user_data['daily_completion'].get(today_str, {'morning': {}, 'evening': {}})
+    today_str = _today_str()
+    # The daily checker may have created today's entry without the routine's morning/evening keys
+    today_entry = user_data['daily_completion'].get(today_str, {})
+    daily_completion = {'morning': today_entry.get('morning', {}), 'evening': today_entry.get('evening', {})}
 
     # --- Morning Routine ---
     st.subheader(get_i18n('morning_routine'))
@@ -864,11 +1232,10 @@ def my_routine_page():
         for i, step in enumerate(current_routine['morning']):
             step_key = f'morning_{i}'
             default_checked = daily_completion['morning'].get(step_key, False)
-            if st.checkbox(step, key=step_key, value=default_checked):
-                daily_completion['morning'][step_key] = True
-                morning_completed += 1
-            else:
-                daily_completion['morning'][step_key] = False
+            checked = st.checkbox(step, key=step_key, value=default_checked)
+            if checked != default_checked: # Only touch the stored state when the box actually changed
+                daily_completion['morning'][step_key] = checked
+            morning_completed += checked
         
         st.progress(morning_completed / total_morning, text=f"{morning_completed}/{total_morning} steps completed.")
 
@@ -882,11 +1249,10 @@ def my_routine_page():
         for i, step in enumerate(current_routine['evening']):
             step_key = f'evening_{i}'
             default_checked = daily_completion['evening'].get(step_key, False)
-            if st.checkbox(step, key=step_key, value=default_checked):
-                daily_completion['evening'][step_key] = True
-                evening_completed += 1
-            else:
-                daily_completion['evening'][step_key] = False
+            checked = st.checkbox(step, key=step_key, value=default_checked)
+            if checked != default_checked: # Only touch the stored state when the box actually changed
+                daily_completion['evening'][step_key] = checked
+            evening_completed += checked
         
         st.progress(evening_completed / total_evening, text=f"{evening_completed}/{total_evening} steps completed.")
         
@@ -909,70 +1275,116 @@ def my_routine_page():
             else:
                 st.info(get_i18n('more_work'))
             
-            # Update user data
-            user_data['daily_completion'][today_str] = {
-                'morning': daily_completion['morning'],
-                'evening': daily_completion['evening'],
-                'is_complete': is_complete_today,
-                'points_awarded': points_to_award
-            }
+            # Update user data (merged into today's entry, so checker progress is kept)
+            append_event(username, {
+                'type': 'daily_completion',
+                'day': today_str,
+                'entry': {
+                    'morning': daily_completion['morning'],
+                    'evening': daily_completion['evening'],
+                    'is_complete': is_complete_today,
+                    'points_awarded': points_to_award
+                }
+            })
             if points_to_award > 0:
                 update_user_points(username, points_to_award)
-            save_data(DATA_FILE, DATA)
             st.rerun()
         else:
             st.warning("You have already finalized your routine for today.")
 
+# Static Product Data
+PRODUCTS = [
+    {'id': 1, 'name': 'Hydrating Gentle Cleanser', 'price': 19.99, 'concern': ['Dryness', 'Sensitivity'], 'ingredients': ['Ceramides', 'Hyaluronic Acid'], 'description': 'A non-foaming, gentle cleanser that respects the skin barrier.', 'link': 'https://affiliate.link/cleanser'},
+    {'id': 2, 'name': '2% Salicylic Acid Serum', 'price': 24.50, 'concern': ['Acne', 'Oily'], 'ingredients': ['Salicylic Acid', 'Niacinamide'], 'description': 'Targets blackheads and breakouts, exfoliating deep inside the pores.', 'link': 'https://affiliate.link/salicylic'},
+    {'id': 3, 'name': 'Vitamin C Brightening Serum', 'price': 45.00, 'concern': ['Pigmentation', 'Wrinkles'], 'ingredients': ['Ascorbic Acid', 'Vitamin E'], 'description': 'Potent antioxidant that brightens skin and protects against environmental damage.', 'link': 'https://affiliate.link/vitaminc'},
+    {'id': 4, 'name': 'Mineral SPF 50 Sunscreen', 'price': 29.00, 'concern': ['All'], 'ingredients': ['Zinc Oxide', 'Titanium Dioxide'], 'description': 'Broad-spectrum mineral filter, no white cast on most skin tones.', 'link': 'https://affiliate.link/spf'},
+    {'id': 5, 'name': 'Retinol 0.5% Night Cream', 'price': 39.99, 'concern': ['Wrinkles'], 'ingredients': ['Retinol', 'Peptides'], 'description': 'Powerful night cream to reduce signs of aging.', 'link': 'https://affiliate.link/retinol'},
+]
+
+@st.cache_resource
+def _product_facets():
+    """Sorted filter options for PRODUCTS plus concern/ingredient -> product-id inverted indices.
+
+    Shared read-only across sessions, so cache_resource avoids cache_data's per-call copy.
+    """
+    concern_idx, ingredient_idx = {}, {}
+    for p in PRODUCTS:
+        for c in p['concern']:
+            concern_idx.setdefault(c, set()).add(p['id'])
+        for i in p['ingredients']:
+            ingredient_idx.setdefault(i, set()).add(p['id'])
+    return sorted(concern_idx), sorted(ingredient_idx), concern_idx, ingredient_idx
+
+@st.cache_data
+def _product_cards_html():
+    """Pre-rendered HTML body (name, price, concerns, description, ingredients) for each product id."""
+    return {
+        p['id']: f"""
+            <h3 style="margin: 0 0 4px 0;">{html.escape(p['name'])}</h3>
+            <p style="margin: 0;"><strong>${p['price']:.2f}</strong> | Concerns: <em>{html.escape(', '.join(p['concern']))}</em></p>
+            <p style="margin: 4px 0; color: grey; font-size: 0.9em;">{html.escape(p['description'])}</p>
+            <p style="margin: 0;"><strong>Key Ingredients:</strong> {html.escape(', '.join(p['ingredients']))}</p>
+        """
+        for p in PRODUCTS
+    }
+
+def _add_to_kit(username, product):
+    """Button callback: saves a product to the user's kit."""
+    # Save only a necessary subset of product data
+    append_event(username, {'type': 'kit_add', 'item': {
+        'id': product['id'],
+        'name': product['name'],
+        'concern': product['concern']
+    }})
+    st.toast(f"Added **{product['name']}** to your kit!")
+
+def _remove_from_kit(username, product):
+    """Button callback: removes a product from the user's kit."""
+    append_event(username, {'type': 'kit_remove', 'product_id': product['id']})
+    st.toast(f"Removed **{product['name']}** from your kit.")
+
 def product_marketplace_page():
     """Page 5: Static product list with filters and save-to-kit functionality."""
     username = get_current_user()
     user_data = get_user_data(username)
     st.title(get_i18n('marketplace'))
     
-    # Static Product Data
-    PRODUCTS = [
-        {'id': 1, 'name': 'Hydrating Gentle Cleanser', 'price': 19.99, 'concern': ['Dryness', 'Sensitivity'], 'ingredients': ['Ceramides', 'Hyaluronic Acid'], 'description': 'A non-foaming, gentle cleanser that respects the skin barrier.', 'link': 'https://affiliate.link/cleanser'},
-        {'id': 2, 'name': '2% Salicylic Acid Serum', 'price': 24.50, 'concern': ['Acne', 'Oily'], 'ingredients': ['Salicylic Acid', 'Niacinamide'], 'description': 'Targets blackheads and breakouts, exfoliating deep inside the pores.', 'link': 'https://affiliate.link/salicylic'},
-        {'id': 3, 'name': 'Vitamin C Brightening Serum', 'price': 45.00, 'concern': ['Pigmentation', 'Wrinkles'], 'ingredients': ['Ascorbic Acid', 'Vitamin E'], 'description': 'Potent antioxidant that brightens skin and protects against environmental damage.', 'link': 'https://affiliate.link/vitaminc'},
-        {'id': 4, 'name': 'Mineral SPF 50 Sunscreen', 'price': 29.00, 'concern': ['All'], 'ingredients': ['Zinc Oxide', 'Titanium Dioxide'], 'description': 'Broad-spectrum mineral filter, no white cast on most skin tones.', 'link': 'https://affiliate.link/spf'},
-        {'id': 5, 'name': 'Retinol 0.5% Night Cream', 'price': 39.99, 'concern': ['Wrinkles'], 'ingredients': ['Retinol', 'Peptides'], 'description': 'Powerful night cream to reduce signs of aging.', 'link': 'https://affiliate.link/retinol'},
-    ]
-    
     # --- Filtering Sidebar ---
     st.sidebar.markdown("## Marketplace Filters")
-    all_concerns = sorted(list(set(c for p in PRODUCTS for c in p['concern'])))
+    all_concerns, all_ingredients, concern_idx, ingredient_idx = _product_facets()
     selected_concerns = st.sidebar.multiselect("Filter by Concern", all_concerns, key='market_concern')
     
-    all_ingredients = sorted(list(set(i for p in PRODUCTS for i in p['ingredients'])))
     selected_ingredients = st.sidebar.multiselect("Filter by Key Ingredient", all_ingredients, key='market_ingr')
     
     # --- Filtering Logic ---
-    filtered_products = PRODUCTS
-    
-    if selected_concerns:
-        filtered_products = [p for p in filtered_products if any(c in p['concern'] for c in selected_concerns)]
-        
-    if selected_ingredients:
-        filtered_products = [p for p in filtered_products if any(i in p['ingredients'] for i in selected_ingredients)]
+    if not (selected_concerns or selected_ingredients):
+        filtered_products = PRODUCTS # Nothing selected: no set work at all
+    else:
+        # Any selected concern AND any selected ingredient, via set operations on the inverted indices
+        matching_ids = {p['id'] for p in PRODUCTS}
         
+        if selected_concerns:
+            matching_ids &= set.union(*(concern_idx[c] for c in selected_concerns))
+            
+        if selected_ingredients:
+            matching_ids &= set.union(*(ingredient_idx[i] for i in selected_ingredients))
+            
+        filtered_products = [p for p in PRODUCTS if p['id'] in matching_ids] # Keep catalog order
+    
     st.info(f"Showing **{len(filtered_products)}** products.")
 
     # --- Product Display ---
-    kit_ids = [p['id'] for p in user_data['kit']]
+    kit = user_data['kit']
+    save_label = get_i18n('save_kit') # Same label on every card
+    card_html = _product_cards_html()
 
+    # Lay out the whole grid first, then fill it cell by cell
+    rows = [st.columns(2) for _ in range((len(filtered_products) + 1) // 2)]
     for i, product in enumerate(filtered_products):
-        if i % 2 == 0:
-            cols = st.columns(2)
-            col = cols[0]
-        else:
-            col = cols[1]
-
-        with col:
+        with rows[i // 2][i % 2]:
             with st.container(border=True):
-                st.subheader(product['name'])
-                st.markdown(f"**${product['price']:.2f}** | Concerns: *{', '.join(product['concern'])}*")
-                st.caption(product['description'])
-                st.markdown(f"**Key Ingredients:** {', '.join(product['ingredients'])}")
+                # Static card body as one element; only the buttons below are widgets
+                st.html(card_html[product['id']])
                 
                 col_btn1, col_btn2 = st.columns([1, 1])
                 
@@ -980,24 +1392,14 @@ def product_marketplace_page():
                 col_btn1.link_button("View Product (Affiliate)", product['link'], use_container_width=True)
                 
                 # Save to Kit button
-                if product['id'] in kit_ids:
-                    col_btn2.button("In My Kit (Remove)", key=f"remove_{product['id']}", use_container_width=True)
-                    if col_btn2.button("In My Kit (Remove)", key=f"remove_{product['id']}", use_container_width=True):
-                        user_data['kit'] = [p for p in user_data['kit'] if p['id'] != product['id']]
-                        save_data(DATA_FILE, DATA)
-                        st.toast(f"Removed **{product['name']}** from your kit.")
-                        st.rerun()
+                # Callbacks run before the next script run, so the button label is already
+                # up to date on that run and no extra st.rerun() is needed
+                if product['id'] in kit:
+                    col_btn2.button("In My Kit (Remove)", key=f"remove_{product['id']}", use_container_width=True,
+                                    on_click=_remove_from_kit, args=(username, product))
                 else:
-                    if col_btn2.button(get_i18n('save_kit'), key=f"save_{product['id']}", use_container_width=True):
-                        # Save only a necessary subset of product data
-                        user_data['kit'].append({
-                            'id': product['id'],
-                            'name': product['name'],
-                            'concern': product['concern']
-                        })
-                        save_data(DATA_FILE, DATA)
-                        st.toast(f"Added **{product['name']}** to your kit!")
-                        st.rerun()
+                    col_btn2.button(save_label, key=f"save_{product['id']}", use_container_width=True,
+                                    on_click=_add_to_kit, args=(username, product))
 
 def personalized_kit_page():
     """Page 6: Shows saved products and explains their relevance."""
@@ -1015,25 +1417,15 @@ def personalized_kit_page():
         return
 
     # --- Display Kit ---
-    for i, product in enumerate(kit):
-        if i % 3 == 0:
-            cols = st.columns(3)
-            col = cols[0]
-        elif i % 3 == 1:
-            col = cols[1]
-        else:
-            col = cols[2]
-            
-        with col:
+    rows = [st.columns(3) for _ in range((len(kit) + 2) // 3)]
+    for i, product in enumerate(kit.values()):
+        with rows[i // 3][i % 3]:
             with st.container(border=True):
                 st.markdown(f"**{product['name']}**")
                 st.caption(f"Targets: {', '.join(product['concern'])}")
                 
-                if st.button("Remove", key=f"remove_kit_{product['id']}", use_container_width=True):
-                    user_data['kit'] = [p for p in user_data['kit'] if p['id'] != product['id']]
-                    save_data(DATA_FILE, DATA)
-                    st.toast(f"Removed {product['name']}.")
-                    st.rerun()
+                st.button("Remove", key=f"remove_kit_{product['id']}", use_container_width=True,
+                          on_click=_remove_from_kit, args=(username, product))
     
     st.markdown("---")
     
@@ -1044,7 +1436,7 @@ def personalized_kit_page():
         st.info(f"Based on your last analysis (Score: {last_analysis['current_score']}, Acne Risk: {last_analysis['acne_risk_pct']}%).")
         
         # Analyze why each product is needed
-        kit_concerns = set(c for p in kit for c in p['concern'])
+        kit_concerns = set(c for p in kit.values() for c in p['concern'])
         
         st.markdown("**Your Kit Concerns:**")
         
@@ -1052,7 +1444,7 @@ def personalized_kit_page():
             st.markdown("- **Acne:** Your kit includes *Acne* targeting products, which is essential given your **high Acne Risk** in the last analysis.")
         
         if 'Dryness' in kit_concerns and last_analysis['hydration_score'] < 70:
-            st.markdown("- **Dryness/Hydration:** Products for *Dryness* help address your **low Hydration Score** of {last_analysis['hydration_score']}% found in the analysis.")
+            st.markdown(f"- **Dryness/Hydration:** Products for *Dryness* help address your **low Hydration Score** of {last_analysis['hydration_score']}% found in the analysis.")
             
         if 'Wrinkles' in kit_concerns and last_analysis['future_score_proj_90'] < last_analysis['current_score']:
             st.markdown("- **Anti-Aging/Wrinkles:** Products targeting *Wrinkles* support your long-term skin health, especially when lifestyle factors (stress/sleep) are negatively impacting your projection.")
@@ -1101,10 +1493,35 @@ def skincare_academy_page():
     else:
         st.info("No articles found matching your search.")
 
+FORUM_PAGE_SIZE = 50
+
+def _add_comment(username, post):
+    """Button callback: adds the comment typed under a post, then clears the input."""
+    input_key = f"comment_{post['id']}"
+    comment_text = st.session_state.get(input_key, '')
+    if not comment_text:
+        st.toast("Comment cannot be empty.")
+        return
+    # The comment is stored on the post owner's entry, looked up by post ID
+    append_event(username, {
+        'type': 'forum_comment',
+        'post_owner': post['user'],
+        'post_id': post['id'],
+        'comment': {'id': uuid.uuid4().hex, 'user': username, 'body': comment_text, 'timestamp': datetime.now().isoformat()}
+    })
+    st.session_state[input_key] = ''
+
+@st.cache_resource
+def _all_forum_posts(_data):
+    """Every user's forum posts, newest first. Built once per process; new posts are inserted in place."""
+    all_posts = [post for user_data in _data.values() for post in user_data.get('forum_posts', [])]
+    all_posts.sort(key=lambda x: x['timestamp'], reverse=True)
+    return all_posts
+
 def community_forum_page():
     """Page 8: Basic local Q&A forum."""
     username = get_current_user()
-    user_data = get_user_data(username)
+    get_user_data(username) # Makes sure the poster has an entry; posts themselves go through append_event
     st.title(get_i18n('forum'))
     
     st.subheader(get_i18n('community_q'))
@@ -1126,50 +1543,38 @@ def community_forum_page():
                     'timestamp': datetime.now().isoformat(),
                     'comments': []
                 }
-                user_data['forum_posts'].insert(0, new_post)
-                save_data(DATA_FILE, DATA)
-                st.success("Your question has been posted!")
-                st.rerun()
+                # Fetch the shared index first: built after append_event (e.g. after a cache clear),
+                # it would already hold the post and the insert below would duplicate it
+                posts = _all_forum_posts(DATA)
+                append_event(username, {'type': 'forum_post', 'post': new_post})
+                # A new post is always the newest, so it goes to the front of the shared index
+                posts.insert(0, new_post)
+                st.success("Your question has been posted!") # The list below is rendered after this, so it already shows the post
             else:
                 st.error("Please fill in both the question and details.")
                 
     st.markdown("---")
     
     # --- Display Existing Posts (Shared across all users for the demo) ---
-    all_posts = []
-    for user in DATA:
-        all_posts.extend(DATA[user].get('forum_posts', []))
-        
-    # Sort by time
-    all_posts.sort(key=lambda x: x['timestamp'], reverse=True)
+    all_posts = _all_forum_posts(DATA)
     
     if all_posts:
-        for post in all_posts:
+        if len(all_posts) > FORUM_PAGE_SIZE:
+            st.caption(f"Showing the {FORUM_PAGE_SIZE} most recent of {len(all_posts)} questions.")
+        for post in all_posts[:FORUM_PAGE_SIZE]:
             with st.container(border=True):
                 st.subheader(post['title'])
-                st.caption(f"Posted by **{post['user']}** on {datetime.fromisoformat(post['timestamp']).strftime('%b %d, %H:%M')}")
+                st.caption(f"Posted by **{post['user']}** on {format_timestamp(post['timestamp'], '%b %d, %H:%M')}")
                 st.write(post['body'])
                 
-                # Simple comment feature (in-memory per session for demo, but saved for future use)
+                # Simple comment feature, persisted on the post owner's entry
                 with st.expander(f"View/Add Comments ({len(post['comments'])})"):
                     for comment in post['comments']:
                         st.markdown(f"**{comment['user']}**: {comment['body']}")
-                        st.caption(datetime.fromisoformat(comment['timestamp']).strftime('%H:%M'))
+                        st.caption(format_timestamp(comment['timestamp'], '%H:%M'))
                     
-                    comment_text = st.text_input("Your comment:", key=f"comment_{post['id']}")
-                    if st.button("Add Comment", key=f"add_comment_{post['id']}"):
-                        if comment_text:
-                            # Note: To fully implement this, we'd need to find the post ID in the DATA structure
-                            # and add the comment there. For a demo, we will simply use the current post object
-                            # but acknowledge that this is *not* persistent across users in this simplified code.
-                            # The persistent comments would require the real ID lookup.
-                            st.info("Comment feature is a placeholder. In a real app, this would be saved persistently.")
-                            post['comments'].append({'user': username, 'body': comment_text, 'timestamp': datetime.now().isoformat()})
-                            # Re-save the main DATA file (expensive, but necessary for this simple JSON structure)
-                            save_data(DATA_FILE, DATA)
-                            st.rerun()
-                        else:
-                            st.warning("Comment cannot be empty.")
+                    st.text_input("Your comment:", key=f"comment_{post['id']}")
+                    st.button("Add Comment", key=f"add_comment_{post['id']}", on_click=_add_comment, args=(username, post))
     else:
         st.info("No questions posted yet. Be the first!")
 
@@ -1205,7 +1610,7 @@ def consult_expert_page():
                     'status': 'Pending'
                 }
                 user_data['expert_requests'].append(new_request)
-                save_data(DATA_FILE, DATA)
+                save_user_data(username)
                 st.success("Your consultation request has been submitted. An expert will reach out soon!")
             else:
                 st.error("Please fill in all fields.")
@@ -1215,18 +1620,33 @@ def consult_expert_page():
     
     requests = sorted(user_data['expert_requests'], key=lambda x: x['timestamp'], reverse=True)
     if requests:
+        # Render every request card into one HTML string and send it as a single element
+        cards = []
         for request in requests:
             status_color = "green" if request['status'] == 'Confirmed' else "orange"
-            st.markdown(f"""
+            cards.append(f"""
                 <div style="padding: 10px; margin-bottom: 10px; border-radius: 5px; border-left: 5px solid {ACCENT_COLOR}; background-color: white;">
                     <p style="margin: 0;"><strong>Date:</strong> {request['date']} at {request['time']}</p>
-                    <p style="margin: 0;"><strong>Note:</strong> {request['note'][:50]}...</p>
+                    <p style="margin: 0;"><strong>Note:</strong> {html.escape(request['note'][:50])}...</p>
                     <p style="margin: 0; color: {status_color};"><strong>Status:</strong> {request['status']}</p>
                 </div>
-            """, unsafe_allow_html=True)
+            """)
+        st.html("".join(cards))
     else:
         st.info(get_i18n('no_requests'))
 
+# Score delta simulator: points per unit of sleep, water, stress and diet, and the current/optimized
+# baselines each habit is measured against. Stress hurts as it rises, so it enters negated.
+_SIM_WEIGHTS = np.array([2.0, 3.0, 1.5, 2.0])
+_SIM_BASELINES = np.array([[6, 2.5, -5, 3],
+                           [8, 3.5, -5, 4]])
+
+# Slider labels shared by the current and optimized columns
+SIM_LABEL_SLEEP: Final = "Sleep Hours"
+SIM_LABEL_WATER: Final = "Water Intake (L/day)"
+SIM_LABEL_STRESS: Final = "Stress Level (1-10)"
+SIM_LABEL_DIET: Final = "Diet Quality (1-5)"
+
 def hyper_personalized_advice_page():
     """Page 10: Static write-up with a simulation tool."""
     st.title(get_i18n('hyper_advice'))
@@ -1257,31 +1677,32 @@ def hyper_personalized_advice_page():
     
     with col_sim1:
         st.caption("Current State (Simulated Defaults)")
-        sim_sleep = st.slider("Sleep Hours", 4, 12, 6, key='sim_sleep')
-        sim_water = st.slider("Water Intake (L/day)", 0.5, 4.0, 1.5, step=0.5, key='sim_water')
-        sim_stress = st.slider("Stress Level (1-10)", 1, 10, 8, key='sim_stress')
-        sim_diet = st.slider("Diet Quality (1-5)", 1, 5, 2, key='sim_diet')
+        sim_sleep = st.slider(SIM_LABEL_SLEEP, 4, 12, 6, key='sim_sleep')
+        sim_water = st.slider(SIM_LABEL_WATER, 0.5, 4.0, 1.5, step=0.5, key='sim_water')
+        sim_stress = st.slider(SIM_LABEL_STRESS, 1, 10, 8, key='sim_stress')
+        sim_diet = st.slider(SIM_LABEL_DIET, 1, 5, 2, key='sim_diet')
 
     with col_sim2:
         st.caption("Optimized Target State")
-        opt_sleep = st.slider("Sleep Hours", 4, 12, 8, key='opt_sleep')
-        opt_water = st.slider("Water Intake (L/day)", 0.5, 4.0, 3.0, step=0.5, key='opt_water')
-        opt_stress = st.slider("Stress Level (1-10)", 1, 10, 3, key='opt_stress')
-        opt_diet = st.slider("Diet Quality (1-5)", 1, 5, 4, key='opt_diet')
+        opt_sleep = st.slider(SIM_LABEL_SLEEP, 4, 12, 8, key='opt_sleep')
+        opt_water = st.slider(SIM_LABEL_WATER, 0.5, 4.0, 3.0, step=0.5, key='opt_water')
+        opt_stress = st.slider(SIM_LABEL_STRESS, 1, 10, 3, key='opt_stress')
+        opt_diet = st.slider(SIM_LABEL_DIET, 1, 5, 4, key='opt_diet')
 
     if st.button(get_i18n('simulate'), use_container_width=True):
         # Deterministic logic for score delta
         score_base = 70
         
-        # Current Delta (Negative impact for poor habits)
-        cur_delta = (6 - sim_sleep) * 2 + (2.5 - sim_water) * 3 + (sim_stress - 5) * 1.5 + (3 - sim_diet) * 2
+        # Current and Optimized Deltas (negative impact for poor habits) from one matrix-vector product
+        habits = np.array([[sim_sleep, sim_water, -sim_stress, sim_diet],
+                           [opt_sleep, opt_water, -opt_stress, opt_diet]])
+        cur_delta, opt_delta = (_SIM_BASELINES - habits) @ _SIM_WEIGHTS
+        
         current_score = int(score_base - cur_delta)
-        current_score = max(50, min(90, current_score))
+        current_score = _clamp(current_score, 50, 90)
         
-        # Optimized Delta (Positive impact for good habits)
-        opt_delta = (8 - opt_sleep) * 2 + (3.5 - opt_water) * 3 + (opt_stress - 5) * 1.5 + (4 - opt_diet) * 2
         optimized_score = int(score_base - opt_delta)
-        optimized_score = max(70, min(99, optimized_score))
+        optimized_score = _clamp(optimized_score, 70, 99)
         
         score_delta = optimized_score - current_score
         
@@ -1295,13 +1716,29 @@ def hyper_personalized_advice_page():
         
         st.subheader("Actionable Insights")
         
-        actions = []
-        if opt_sleep > sim_sleep: actions.append(f"- **Increase Sleep:** Target {opt_sleep} hours/night to boost skin repair.")
-        if opt_water > sim_water: actions.append(f"- **Hydrate More:** Increase water intake to {opt_water}L/day for better plumpness.")
-        if opt_stress < sim_stress: actions.append(f"- **Reduce Stress:** Implement a daily 10-minute mindfulness practice.")
-        if opt_diet > sim_diet: actions.append(f"- **Improve Diet:** Focus on whole foods and anti-inflammatory ingredients.")
-        
-        st.markdown("\n".join(actions))
+        actions = (
+            (opt_sleep > sim_sleep, f"- **Increase Sleep:** Target {opt_sleep} hours/night to boost skin repair."),
+            (opt_water > sim_water, f"- **Hydrate More:** Increase water intake to {opt_water}L/day for better plumpness."),
+            (opt_stress < sim_stress, "- **Reduce Stress:** Implement a daily 10-minute mindfulness practice."),
+            (opt_diet > sim_diet, "- **Improve Diet:** Focus on whole foods and anti-inflammatory ingredients."),
+        )
+        st.markdown("\n".join(action for applies, action in actions if applies))
+
+# Static FAQ Data
+FAQ_ENTRIES = ( # (question, answer) pairs in display order
+    ("What is the best routine order?", "The general rule is thinnest to thickest consistency: Cleanser > Toner > Serum > Eye Cream > Moisturizer > Sunscreen (AM only)."),
+    ("Can I mix Vitamin C and Retinol?", "It's generally advised not to mix them in the same routine, as it can cause irritation. Use Vitamin C in the morning and Retinol at night."),
+    ("Why is my skin suddenly breaking out?", "Sudden breakouts can be caused by hormonal changes, stress, diet (especially high GI foods), or a new product introduced into your routine."),
+    ("What does 'non-comedogenic' mean?", "It means the product has been formulated in a way that is less likely to block pores, which is especially important for acne-prone and oily skin types."),
+    ("How much sunscreen should I use?", "You should use about a nickel-sized amount for your face alone to achieve the SPF protection listed on the bottle. Reapply every two hours."),
+    ("How often should I exfoliate?", "For chemical exfoliants (AHAs/BHAs), 2-3 times per week is usually sufficient. Over-exfoliating can damage your skin barrier."),
+)
+@st.cache_resource(show_spinner=False)
+def _faq_display():
+    """Expander labels and answer markdown for the FAQ, built once per process and shared by all sessions."""
+    return tuple((f"Q: {question}", f"**A:** {answer}") for question, answer in FAQ_ENTRIES)
+
+_FAQ_DISPLAY = _faq_display()
 
 def ai_chatbot_page():
     """Page 11: Simple FAQ with pre-seeded questions/answers."""
@@ -1309,20 +1746,44 @@ def ai_chatbot_page():
     st.subheader("Pre-seeded Skincare Q&A")
     st.info("No external AI calls are made. Select a question to see the expert answer.")
     
-    faq = {
-        "What is the best routine order?": "The general rule is thinnest to thickest consistency: Cleanser > Toner > Serum > Eye Cream > Moisturizer > Sunscreen (AM only).",
-        "Can I mix Vitamin C and Retinol?": "It's generally advised not to mix them in the same routine, as it can cause irritation. Use Vitamin C in the morning and Retinol at night.",
-        "Why is my skin suddenly breaking out?": "Sudden breakouts can be caused by hormonal changes, stress, diet (especially high GI foods), or a new product introduced into your routine.",
-        "What does 'non-comedogenic' mean?": "It means the product has been formulated in a way that is less likely to block pores, which is especially important for acne-prone and oily skin types.",
-        "How much sunscreen should I use?": "You should use about a nickel-sized amount for your face alone to achieve the SPF protection listed on the bottle. Reapply every two hours.",
-        "How often should I exfoliate?": "For chemical exfoliants (AHAs/BHAs), 2-3 times per week is usually sufficient. Over-exfoliating can damage your skin barrier.",
-    }
-    
-    questions = list(faq.keys())
-    
-    for question in questions:
-        with st.expander(f"Q: {question}"):
-            st.write(f"**A:** {faq[question]}")
+    for label, answer in _FAQ_DISPLAY:
+        with st.expander(label):
+            st.write(answer)
+
+# 15 Tasks for Morning/Night as (key, label) pairs, already split by section so the page needs no filtering
+AM_TASKS = (
+    ('AM_1', "Applied prescribed Vitamin C/Antioxidant Serum (AM)"),
+    ('AM_2', "Applied Sunscreen with SPF 30+ (AM)"),
+    ('AM_3', "Consumed a full glass of water upon waking"),
+    ('AM_4', "Engaged in 5 minutes of mindful breathing/meditation"),
+    ('AM_5', "Avoided high-sugar breakfast"),
+)
+PM_TASKS = (
+    ('PM_1', "Completed double cleanse (PM)"),
+    ('PM_2', "Applied prescribed Retinol/Active Treatment (PM)"),
+    ('PM_3', "Applied eye cream and moisturized neck/chest (PM)"),
+    ('PM_4', "Avoided screen time 30 mins before bed"),
+    ('PM_5', "Logged 7+ hours of sleep last night"),
+)
+LIFE_TASKS = (
+    ('LIFE_1', "Ate 3+ servings of vegetables/fruits"),
+    ('LIFE_2', "Drank 2L+ of water throughout the day"),
+    ('LIFE_3', "Avoided picking/touching face unnecessarily"),
+    ('LIFE_4', "Changed pillowcase/towel (weekly check)"),
+    ('LIFE_5', "Completed a 30-min physical activity"),
+)
+
+@st.cache_resource(show_spinner=False)
+def _checker_tasks():
+    """The flat task map and the all-unticked checker state, built once per process.
+
+    Streamlit re-executes this script on every rerun, so plain module-level dicts would be rebuilt
+    each time; the read-only views are safe to share across sessions.
+    """
+    all_tasks = MappingProxyType(dict(AM_TASKS + PM_TASKS + LIFE_TASKS))
+    return all_tasks, MappingProxyType(dict.fromkeys(all_tasks, False))
+
+ALL_TASKS, CHECKER_DEFAULTS = _checker_tasks()
 
 def daily_routine_ai_checker_page():
     """Page 12: Daily checklist and points award."""
@@ -1331,64 +1792,53 @@ def daily_routine_ai_checker_page():
     st.title(get_i18n('daily_checker'))
     st.subheader("Daily Holistic Checklist")
     
-    today_str = date.today().isoformat()
+    today_str = _today_str()
     daily_completion = user_data['daily_completion'].get(today_str, {'checker': {}})
     
-    # 15 Tasks for Morning/Night
-    tasks = {
-        'AM_1': "Applied prescribed Vitamin C/Antioxidant Serum (AM)",
-        'AM_2': "Applied Sunscreen with SPF 30+ (AM)",
-        'AM_3': "Consumed a full glass of water upon waking",
-        'AM_4': "Engaged in 5 minutes of mindful breathing/meditation",
-        'AM_5': "Avoided high-sugar breakfast",
-        'PM_1': "Completed double cleanse (PM)",
-        'PM_2': "Applied prescribed Retinol/Active Treatment (PM)",
-        'PM_3': "Applied eye cream and moisturized neck/chest (PM)",
-        'PM_4': "Avoided screen time 30 mins before bed",
-        'PM_5': "Logged 7+ hours of sleep last night",
-        'LIFE_1': "Ate 3+ servings of vegetables/fruits",
-        'LIFE_2': "Drank 2L+ of water throughout the day",
-        'LIFE_3': "Avoided picking/touching face unnecessarily",
-        'LIFE_4': "Changed pillowcase/towel (weekly check)",
-        'LIFE_5': "Completed a 30-min physical activity",
-    }
-    
-    current_checker = daily_completion.get('checker', {})
+    # Start from every task unticked so the checkbox loops can index the dict directly
+    saved_checker = {**CHECKER_DEFAULTS, **daily_completion.get('checker', {})}
+    current_checker = dict(saved_checker)
     
     st.markdown("---")
-    st.subheader("Morning & Evening Tasks")
     
-    col_am, col_pm = st.columns(2)
+    completed_tasks = 0 # Counted as the checkboxes are drawn
     
-    # Morning Tasks
-    am_tasks = {k: v for k, v in tasks.items() if k.startswith('AM')}
-    with col_am:
-        for k, v in am_tasks.items():
-            default = current_checker.get(k, False)
-            current_checker[k] = st.checkbox(v, value=default, key=k)
-
-    # Evening Tasks
-    pm_tasks = {k: v for k, v in tasks.items() if k.startswith('PM')}
-    with col_pm:
-        for k, v in pm_tasks.items():
-            default = current_checker.get(k, False)
-            current_checker[k] = st.checkbox(v, value=default, key=k)
+    # The checkboxes sit in one form, so ticking through the list costs a single rerun on submit
+    with st.form("daily_checker"):
+        st.subheader("Morning & Evening Tasks")
+        
+        col_am, col_pm = st.columns(2)
+        
+        # Morning Tasks
+        with col_am:
+            for k, v in AM_TASKS:
+                checked = st.checkbox(v, value=current_checker[k], key=k)
+                current_checker[k] = checked
+                completed_tasks += checked
+
+        # Evening Tasks
+        with col_pm:
+            for k, v in PM_TASKS:
+                checked = st.checkbox(v, value=current_checker[k], key=k)
+                current_checker[k] = checked
+                completed_tasks += checked
 
-    st.markdown("---")
-    st.subheader("Holistic Lifestyle Tasks")
-    
-    # Lifestyle Tasks
-    life_tasks = {k: v for k, v in tasks.items() if k.startswith('LIFE')}
-    cols_life = st.columns(3)
-    for i, (k, v) in enumerate(life_tasks.items()):
-        with cols_life[i % 3]:
-            default = current_checker.get(k, False)
-            current_checker[k] = st.checkbox(v, value=default, key=k)
+        st.markdown("---")
+        st.subheader("Holistic Lifestyle Tasks")
+        
+        # Lifestyle Tasks
+        cols_life = st.columns(3)
+        for (k, v), col in zip(LIFE_TASKS, cycle(cols_life)):
+            with col:
+                checked = st.checkbox(v, value=current_checker[k], key=k)
+                current_checker[k] = checked
+                completed_tasks += checked
+        
+        submitted = st.form_submit_button("Finalize Daily Checker & Claim Points", use_container_width=True)
 
     st.markdown("---")
     
-    total_tasks = len(tasks)
-    completed_tasks = sum(current_checker.values())
+    total_tasks = len(ALL_TASKS)
     
     current_score = completed_tasks * 5
     
@@ -1396,32 +1846,31 @@ def daily_routine_ai_checker_page():
     st.metric(get_i18n('today_score'), current_score, delta=f"+{current_score} Potential Points")
     
     # --- Finalize & Award Points ---
-    if st.button("Finalize Daily Checker & Claim Points", use_container_width=True):
+    if submitted:
         # Check if points were already awarded for the checker today
         already_awarded = daily_completion.get('checker_points_awarded', 0)
         
         # Calculate new points only if not finalized or if the score is higher (allowing updates)
         new_points = current_score - already_awarded
         
+        unchanged = current_checker == saved_checker
+        if new_points > 0 or not unchanged: # Nothing to write when nothing was ticked or unticked
+            # One small event merges the final state (and any newly awarded score) into today's entry
+            entry = {'checker': current_checker}
+            if new_points > 0:
+                entry['checker_points_awarded'] = current_score
+            append_event(username, {'type': 'daily_completion', 'day': today_str, 'entry': entry})
+        
         if new_points > 0:
             update_user_points(username, new_points)
             st.success(f"Finalized and awarded +{new_points} points for today's checker! Total: {user_data['points']}")
-            
-            # Update data with final state and awarded points
-            daily_completion['checker'] = current_checker
-            daily_completion['checker_points_awarded'] = current_score
-            user_data['daily_completion'][today_str] = daily_completion
-            save_data(DATA_FILE, DATA)
+        elif unchanged:
+            st.info("Checker finalized. No changes since the last check.")
         elif new_points < 0:
-             # This means they deselected tasks after finalizing a high score. Just save the state.
-             daily_completion['checker'] = current_checker
-             user_data['daily_completion'][today_str] = daily_completion
-             save_data(DATA_FILE, DATA)
-             st.info("Checker progress saved. No new points awarded.")
+            # This means they deselected tasks after finalizing a high score. Just save the state.
+            st.info("Checker progress saved. No new points awarded.")
         else:
-            st.info("Checker finalized. No new points earned since the last check.")
-            
-        st.rerun()
+            st.info("Checker progress saved. No new points earned since the last check.")
         
     st.markdown("---")
     
@@ -1455,18 +1904,14 @@ if 'logged_in_user' not in st.session_state:
 if 'language' not in st.session_state:
     st.session_state['language'] = 'English'
 
-def main():
-    """The main function to run the Streamlit application."""
-    
-    st.set_page_config(
-        page_title="SkinAI Assistant",
-        page_icon="✨",
-        layout="wide",
-        initial_sidebar_state="expanded"
-    )
-    
-    # Custom CSS for the clean, soft blue/white theme
-    st.markdown(f"""
+@st.cache_resource(show_spinner=False)
+def _app_css():
+    """Custom CSS for the clean, soft blue/white theme, formatted once per process.
+
+    This file is Streamlit's main script and re-executes on every rerun, so a module-level
+    f-string would be re-formatted each time. The block itself is still sent every rerun.
+    """
+    return f"""
         <style>
             .stApp {{
                 background-color: {DEFAULT_THEME_COLOR};
@@ -1506,7 +1951,37 @@ def main():
                 box-shadow: 0 2px 4px 0 rgba(0,0,0,0.1);
             }}
         </style>
-    """, unsafe_allow_html=True)
+"""
+
+# Page name -> page function. Like the rest of this script it is rebuilt on every rerun; it is not
+# cached, because a cached map would keep calling the first run's page functions after an edit.
+_PAGE_MAP = {
+    'Onboarding': onboarding_page,
+    'Dashboard': dashboard_page,
+    'Skin Analyzer': skin_analyzer_page,
+    'My Routine': my_routine_page,
+    'Product Marketplace': product_marketplace_page,
+    'Personalized Kit': personalized_kit_page,
+    'Skincare Academy': skincare_academy_page,
+    'Community Forum': community_forum_page,
+    'Consult an Expert': consult_expert_page,
+    'Hyper-Personalized Advice': hyper_personalized_advice_page,
+    'AI Chatbot': ai_chatbot_page,
+    'Daily Routine AI Checker': daily_routine_ai_checker_page,
+}
+
+def main():
+    """The main function to run the Streamlit application."""
+    
+    st.set_page_config(
+        page_title="SkinAI Assistant",
+        page_icon="✨",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    
+    # Custom CSS for the clean, soft blue/white theme
+    st.markdown(_app_css(), unsafe_allow_html=True)
 
     if not st.session_state['logged_in_user']:
         login_register_page()
@@ -1515,24 +1990,9 @@ def main():
         
         # Navigation
         page = st.session_state.get('page', 'Dashboard') # Default fallback
-
-        page_map = {
-            'Onboarding': onboarding_page,
-            'Dashboard': dashboard_page,
-            'Skin Analyzer': skin_analyzer_page,
-            'My Routine': my_routine_page,
-            'Product Marketplace': product_marketplace_page,
-            'Personalized Kit': personalized_kit_page,
-            'Skincare Academy': skincare_academy_page,
-            'Community Forum': community_forum_page,
-            'Consult an Expert': consult_expert_page,
-            'Hyper-Personalized Advice': hyper_personalized_advice_page,
-            'AI Chatbot': ai_chatbot_page,
-            'Daily Routine AI Checker': daily_routine_ai_checker_page,
-        }
         
         # Get the function based on the page name and execute it
-        page_func = page_map.get(page)
+        page_func = _PAGE_MAP.get(page)
         
         if page_func:
             page_func()
@@ -1541,4 +2001,8 @@ def main():
             st.error(f"Page not found: {page}")
 
 if __name__ == '__main__':
-    main()
+    try:
+        main()
+    finally:
+        # st.rerun() raises out of main, so flush here to persist the rerun's changes exactly once
+        flush_data()